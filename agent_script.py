@@ -1,128 +1,40 @@
 import os
-import requests
 from dotenv import load_dotenv
 import subprocess
-from langchain_groq import ChatGroq
 
 from langgraph.graph import StateGraph, START, END
 
 from langgraph.prebuilt import tools_condition, ToolNode
+from langgraph.prebuilt.tool_node import ToolInvocationError
 
 from langgraph.graph import MessagesState
 
 import asyncio
-
-from mcp_use.client import MCPClient
-
-from mcp_use.adapters.langchain_adapter import LangChainAdapter
+import sys
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from compaction import build_history_compactor
+from tool_cache import create_tool_cache
+from spotify_results import is_error_result, message_text, parse_created_playlist, playlist_url
+from tool_executor import ParallelToolNode, DEFAULT_TOOL_MAX_CONCURRENCY
+from tool_args import ToolArgCoercer
+from plan_cache import create_plan_cache, create_plan_cache_nodes, route_after_plan_cache
+from track_catalog import create_track_catalog
+from bulk_playlist import BULK_PLAYLIST_TOOL, create_bulk_playlist_tool
+from model_routing import SMALL, classify_step, create_model_router
+from planner import create_planner_node, route_after_planner
+from mcp_pool import MCPSessionPool
+from tool_registry import load_mcp_tools
+from health import run_health_checks
+from metrics import BUDGET_HITS, metrics_handler
+import budgets
+from rate_limits import limiter
 
 load_dotenv()
 PORT = 8090
-
-def check_spotify_credentials():
-
-    """
-
-    Check if Spotify API credentials are valid by attempting to get an access token.
-
-    Returns True if valid, False otherwise.
-
-    """
-
-    client_id = os.getenv("SPOTIFY_CLIENT_ID")
-
-    client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
-
-    redirect_uri = os.getenv("SPOTIFY_REDIRECT_URI")
-
-
-    
-    # Check if credentials exist
-
-    if not all ([client_id, client_secret, redirect_uri]):
-        print("âŒ Missing Spotify credentials in .env file")
-        
-        return False
-
-    
-    # Test credentials by requesting a client credentials token
-
-    auth_url = "https://accounts.spotify.com/api/token"
-
-    auth_headers = {
-
-        "Content-Type": "application/x-www-form-urlencoded"
-
-    }
-
-    auth_data = {
-
-        "grant_type": "client_credentials",
-
-        "client_id": client_id,
-
-        "client_secret": client_secret
-
-    }
-
-
-    try:
-        response = requests.post(auth_url, headers = auth_headers, data = auth_data)
-
-        if response.status_code == 200:
-            print("âœ… Spotify API credentials are valid.")
-            return True
-        else:
-            print(f"âŒ Spotify API credentials are invalid. Status Code: {response.status_code}")
-
-            print(f"Response: {response.json()}")
-
-            return False
-
-    except Exception as e:
-        print(f"âŒ An error occurred while contacting the Spotify API: {e}")
-
-        return False
-
-            
-def check_groq_credentials():
-    """
-    Checks if the Groq API key is valid by attempting to list available models.
-
-    Returns:
-        bool: True if the key is valid, False otherwise.
-    """
-    # 1. Get the API key from environment variables
-    api_key = os.getenv("GROQ_API_KEY")
-
-    # 2. Check if the API key exists in the .env file
-    if not api_key:
-        print("Missing groq api key in .env file")
-        return False
-    # 3. Prepare the request based on Groq's API reference
-    # This endpoint is simple and good for a health check.
-    models_url = "https://api.groq.com/openai/v1/models"
-        
-    # The header must be in the format "Authorization: Bearer YOUR_API_KEY"
-    headers = {
-        "Authorization": f"Bearer {api_key}"
-    }
-
-    # 4. Make the API request and handle potential errors
-    try:
-        response = requests.get(models_url, headers = headers)
-        # A 200 status code means the request was successful and the key is valid.
-        if response.status_code  == 200:
-            print("âœ… Groq API key is valid.")
-            return True
-        else:
-            print(f"âŒ Groq API key is invalid. Status Code: {response.status_code}")
-            print(f"      Response: {response.json()}")
-            return False
-            # If the key is invalid, Groq typically returns a 401 Unauthorized status.
-    except requests.exceptions.RequestException as e:
-        print(f" An error occured while contacting the Groq API: {e}")
-        return False
+DEFAULT_LLM_MAX_CONCURRENCY = 16
+UNLIMITED_RECURSION_LIMIT = sys.maxsize
 
 def kill_processes_on_port(port = PORT):
 
@@ -194,23 +106,88 @@ def kill_processes_on_port(port = PORT):
 
         print(f"Error killing processes on port {port}: {e}")
 
-async def create_graph():
-    # Create client
-    client = MCPClient.from_config_file("mcp_config.json")
-    
-    # Create adapter instance
-    adapter = LangChainAdapter()
-    
-    # Load in tools from the MCP client
-    tools = await adapter.create_tools(client)
-    
-    tools = [t for t in tools if t.name not in ['getNowPlaying', 'getRecentlyPlayed', 'getQueue', 'playMusic', 'pausePlayback', 'skipToNext', 'skipToPrevious', 'resumePlayback', 'addToQueue', 'getMyPlaylists', 'getUsersSavedTracks', 'saveOrRemoveAlbum', 'checkUsersSavedAlbums']]
+async def create_graph(llm=None, tools=None, max_llm_concurrency=None, checkpointer=None, history_compactor=None,
+                       tool_cache=None, parallel_tool_calls=None, planner_mode=None, mcp_pool=None,
+                       max_iterations=None, max_tool_calls=None, plan_cache=None, track_catalog=None,
+                       small_llm=None, model_routes=None):
+    """
+    Build the Spotify agent graph.
+
+    llm and tools can be passed in to skip the Groq model and the MCP server
+    (used by the load tests in benchmarks/). max_llm_concurrency caps how many
+    LLM calls this graph has in flight at once; it defaults to the
+    LLM_MAX_CONCURRENCY environment variable. With a checkpointer the graph
+    keeps each conversation under its thread id (see sessions.py).
+    history_compactor shortens old turns before each LLM call; by default it
+    is built from the HISTORY_COMPACTION settings (see compaction.py).
+    tool_cache serves repeated read-only tool calls such as searchSpotify
+    from memory (see tool_cache.py). parallel_tool_calls lets the model ask
+    for several tools per turn and runs independent searches concurrently
+    (see tool_executor.py); it defaults to the PARALLEL_TOOL_CALLS variable.
+    planner_mode builds playlists from a single structured LLM call and only
+    falls back to the assistant loop when that fails (see planner.py); it
+    defaults to the PLANNER_MODE variable.
+    mcp_pool is the MCPSessionPool whose servers run the tool calls; if
+    neither tools nor a pool is given, a pool is created here. Tool schemas
+    come from the on-disk cache when possible (see tool_registry.py).
+    max_iterations and max_tool_calls cap the assistant turns and tool calls
+    in one request; past either, or past the request deadline set by
+    invoke_our_graph / stream_our_graph, the assistant stops and replies with
+    what it has done so far (see budgets.py).
+    plan_cache reuses the name, description and tracks of an earlier playlist
+    for a near-identical first prompt, skipping straight to createPlaylist and
+    addTracksToPlaylist; by default it is built from the PLAN_CACHE settings
+    and disabled (see plan_cache.py).
+    track_catalog answers track searches from a local index of earlier results
+    and offers it to the model as the searchLocalCatalog tool; by default it
+    is built from the TRACK_CATALOG settings and disabled (see track_catalog.py).
+    small_llm and model_routes send cheap steps such as the final summary to a
+    smaller model, escalating to llm when its tool calls don't validate; by
+    default they come from AGENT_SMALL_MODEL and MODEL_ROUTES, and llm from
+    AGENT_MODEL (see model_routing.py).
+    """
+    if tools is None:
+        if mcp_pool is None:
+            mcp_pool = MCPSessionPool()
+        
+        # Load in tools from the MCP pool; cached schemas let this skip starting the server
+        tools = await load_mcp_tools(mcp_pool)
     
-    # Define llm
-    llm = ChatGroq(model='meta-llama/llama-4-scout-17b-16e-instruct')
+    # Define the models and which step runs on which
+    router = create_model_router(llm, small_llm, model_routes)
     
-    # Bind tools
-    llm_with_tools = llm.bind_tools(tools, parallel_tool_calls=False)
+    if parallel_tool_calls is None:
+        parallel_tool_calls = os.getenv("PARALLEL_TOOL_CALLS", "false").lower() in ("1", "true", "yes")
+
+    if track_catalog is None:
+        track_catalog = create_track_catalog()
+    use_catalog = track_catalog.enabled and any(tool.name == "searchSpotify" for tool in tools)
+    if use_catalog:
+        tools = list(tools) + [track_catalog.as_tool()]
+    # Searches and adds for big playlists run inside one tool call, so the URIs never reach the model
+    bulk_tool = create_bulk_playlist_tool(tools)
+    if bulk_tool is not None:
+        tools = list(tools) + [bulk_tool]
+
+    # Bind each route's tools
+    router.bind_tools(tools, parallel_tool_calls=parallel_tool_calls)
+    arg_coercer = ToolArgCoercer(tools)
+
+    # Cap concurrent LLM calls so a burst of chats can't exceed the provider's limits
+    if max_llm_concurrency is None:
+        max_llm_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_LLM_MAX_CONCURRENCY))
+    llm_semaphore = asyncio.Semaphore(max_llm_concurrency)
+
+    if history_compactor is None:
+        history_compactor = build_history_compactor(router.llm("compaction"))
+
+    if tool_cache is None:
+        tool_cache = create_tool_cache()
+
+    if max_iterations is None:
+        max_iterations = budgets.max_iterations()
+    if max_tool_calls is None:
+        max_tool_calls = budgets.max_tool_calls()
     
     system_msg = """You are a helpful assistant that has access to Spotify. You can create playlists, find songs, and provide music recommendations.
 
@@ -232,57 +209,65 @@ async def create_graph():
     - IMPORTANT: You MUST call addTracksToPlaylist after creating the playlist - never leave a playlist empty
     - IMPORTANT: After creating and populating a playlist, you MUST include the Spotify playlist URL in your response. The createPlaylist tool returns an object with 'id' and 'external_urls'. Always mention the URL like: "Listen here: https://open.spotify.com/playlist/[playlist_id]"
 """
-    def fix_tool_call_parameters(tool_calls):
-        if not tool_calls:
-            return tool_calls
-        
-        fixed_calls = []
-        for call in tool_calls:
-            fixed_call = call.copy()
-            
-            if 'args' in fixed_call and isinstance(fixed_call['args'], dict):
-                fixed_args = {}
-                for key, value in fixed_call['args'].items():
-                    # Handle both {"description": val} and {"key": {"key": val}} patterns
-                    if isinstance(value, dict):
-                        # Try "description" key first
-                        if 'description' in value:
-                            fixed_args[key] = value['description']
-                        # Try the key itself (e.g., {"limit": {"limit": 5}})
-                        elif key in value:
-                            fixed_args[key] = value[key]
-                        # If single-key dict, extract the value
-                        elif len(value) == 1:
-                            fixed_args[key] = list(value.values())[0]
-                        else:
-                            fixed_args[key] = value
-                    else:
-                        fixed_args[key] = value
-                
-                fixed_call['args'] = fixed_args
-            
-            fixed_calls.append(fixed_call)
-        
-        return fixed_calls
-        # Define assistant (INSIDE create_graph, after llm_with_tools and system_msg)
-    def assistant(state: MessagesState):
+    if parallel_tool_calls:
+        system_msg += """
+    Parallel searches:
+    - When a request needs several independent searches (e.g. a mix of genres or artists), call searchSpotify for all of them in the same turn instead of one per turn
+"""
+    if bulk_tool is not None:
+        system_msg += """
+    Large playlists:
+    - For playlists of more than 50 songs, call buildLargePlaylist once with the name, the number of songs and a few search queries (genres, artists, moods) instead of using searchSpotify and addTracksToPlaylist; it finds, deduplicates and adds the tracks itself
+"""
+    if use_catalog:
+        system_msg += """
+    Local catalog:
+    - For common genres and moods, try searchLocalCatalog first; it is instant and its track IDs work with addTracksToPlaylist
+    - Use searchSpotify for anything the catalog doesn't have enough of
+"""
+    async def invoke(route, prompt_messages):
+        async with llm_semaphore:
+            return await router.bound(route).ainvoke([system_msg] + prompt_messages)
+
+    async def call_llm(route, prompt_messages):
+        # Waiting for the rate limit happens outside the semaphore, so a call that is
+        # queued or backing off after a 429 doesn't hold a concurrency slot
+        return await limiter("groq").run(invoke, route, prompt_messages)
+
+    async def assistant(state: MessagesState):
+        iterations, tool_calls_made = _turn_progress(state["messages"])
+        if budgets.expired():
+            return {"messages": [_budget_reply(state["messages"], "deadline")]}
+        if max_iterations and iterations >= max_iterations:
+            return {"messages": [_budget_reply(state["messages"], "iterations")]}
+
         try:
-            response = llm_with_tools.invoke([system_msg] + state["messages"])
-            
-            # Fix malformed tool calls
-            if hasattr(response, 'tool_calls') and response.tool_calls:
-                print(f"\nðŸ”§ Fixing {len(response.tool_calls)} tool call(s)...")
-                fixed_tool_calls = fix_tool_call_parameters(response.tool_calls)
-                response.tool_calls = fixed_tool_calls
-                
-                for i, call in enumerate(fixed_tool_calls):
-                    print(f"   Tool {i+1}: {call.get('name', 'unknown')} with args: {call.get('args', {})}")
+            prompt_messages = await history_compactor(state["messages"])
+            route = classify_step(state["messages"])
+            try:
+                # Waiting for a free LLM slot counts against the deadline too
+                response = await budgets.with_deadline(call_llm(route, prompt_messages))
+                escalation = router.needs_escalation(route, response, arg_coercer)
+            except budgets.DeadlineExceeded:
+                raise
+            except Exception:
+                if router.tier(route) != SMALL:
+                    raise
+                escalation = "error"
+            if escalation:
+                router.escalate(route, escalation)
+                response = await budgets.with_deadline(call_llm("escalation", prompt_messages))
+
+            if max_tool_calls and tool_calls_made + len(response.tool_calls) > max_tool_calls:
+                return {"messages": [_budget_reply(state["messages"], "tool_calls")]}
             
+            # Malformed arguments are repaired against the tool schemas in the tools node (see tool_args.py)
             return {"messages": [response]}
-        
+
+        except budgets.DeadlineExceeded:
+            return {"messages": [_budget_reply(state["messages"], "deadline")]}
         except Exception as e:
             print(f"âŒ Error in assistant: {e}")
-            from langchain_core.messages import AIMessage
             error_msg = AIMessage(content=f"I encountered an error: {str(e)}. Please try rephrasing your request.")
             return {"messages": [error_msg]}
                 
@@ -292,34 +277,203 @@ async def create_graph():
     
     # Define nodes: these do the work
     builder.add_node("assistant", assistant)
-    builder.add_node("tools", ToolNode(tools))
+    # Track searches try the local catalog, then the result cache, then Spotify
+    graph_tools = track_catalog.wrap_tools(tool_cache.wrap_tools(tools))
+    if parallel_tool_calls:
+        max_tool_concurrency = int(os.getenv("TOOL_MAX_CONCURRENCY", DEFAULT_TOOL_MAX_CONCURRENCY))
+        tools_node = ParallelToolNode(graph_tools, max_concurrency=max_tool_concurrency)
+    else:
+        tools_node = ToolNode(graph_tools, handle_tool_errors=_handle_tool_error, name="run_tools")
+    # Repair or reject each call's arguments against the tool schemas before anything runs
+    builder.add_node("tools", arg_coercer.guard(tools_node))
     
+    if planner_mode is None:
+        planner_mode = os.getenv("PLANNER_MODE", "false").lower() in ("1", "true", "yes")
+
+    if plan_cache is None:
+        plan_cache = create_plan_cache()
+
     # Define edges: these determine the control flow
-    builder.add_edge(START, "assistant")
+    first_node = "planner" if planner_mode else "assistant"
+    finish = END
+    if plan_cache.enabled:
+        # Look the prompt up before any LLM call, and remember the plan once the turn is done
+        plan_cache_lookup, remember_plan = create_plan_cache_nodes(plan_cache, graph_tools)
+        builder.add_node("plan_cache", plan_cache_lookup)
+        builder.add_node("remember_plan", remember_plan)
+        builder.add_edge(START, "plan_cache")
+        builder.add_conditional_edges("plan_cache", route_after_plan_cache(first_node), [first_node, END])
+        builder.add_edge("remember_plan", END)
+        finish = "remember_plan"
+    else:
+        builder.add_edge(START, first_node)
+    if planner_mode:
+        builder.add_node("planner", create_planner_node(router.llm("planner"), graph_tools, llm_semaphore, history_compactor))
+        builder.add_conditional_edges("planner", route_after_planner, {"assistant": "assistant", END: finish})
     builder.add_conditional_edges(
         "assistant",
         tools_condition,
+        {"tools": "tools", END: finish},
     )
     builder.add_edge("tools", "assistant")
     
-    graph = builder.compile()
+    graph = builder.compile(checkpointer=checkpointer)
+    # LangGraph's own step limit must leave room for the iteration budget (an assistant and a
+    # tools step each, plus the planner and cache nodes); 0 means unlimited, so effectively no cap
+    recursion_limit = 2 * max_iterations + 5 if max_iterations else UNLIMITED_RECURSION_LIMIT
     
-    return graph
+    return graph.with_config(recursion_limit=recursion_limit)
 
-async def invoke_our_graph(agent, st_messages):
-
-    response = await agent.ainvoke({"messages": st_messages})
+def _turn_progress(messages):
+    """Assistant turns and tool calls made since the last user message."""
+    iterations = tool_calls = 0
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage):
+            break
+        if isinstance(msg, AIMessage):
+            iterations += 1
+            tool_calls += len(msg.tool_calls)
+    return iterations, tool_calls
+
+BUDGET_REASONS = {
+    "deadline": "this request ran out of time",
+    "iterations": "this request took too many steps",
+    "tool_calls": "this request needed too many Spotify calls",
+}
+
+def _budget_reply(messages, budget):
+    """Final message for a request that hit a budget, reporting any playlist made so far."""
+    BUDGET_HITS.inc(budget=budget)
+    print(f"⏱️ Stopping early: {budget} budget exceeded")
+    text = f"I had to stop before finishing because {BUDGET_REASONS[budget]}."
+    playlist = summarize_response(messages)["playlist"]
+    if playlist:
+        text += (f" I did create your playlist with {playlist['track_count']} songs so far."
+                 f" Listen here: {playlist['url']}")
+    else:
+        text += " Please try again, or ask for something a bit simpler."
+    return AIMessage(content=text)
+
+def _handle_tool_error(e: Exception) -> str:
+    # ToolNode's default handling, plus deadline errors so the assistant can still wrap up
+    if isinstance(e, ToolInvocationError):
+        return e.message
+    if isinstance(e, budgets.DeadlineExceeded):
+        return f"Error: {e}"
+    raise e
+
+def _thread_config(thread_id):
+    # Every run reports its node, LLM and tool timings to the shared metrics registry
+    config = {"callbacks": [metrics_handler]}
+    if thread_id:
+        config["configurable"] = {"thread_id": thread_id}
+    return config
+
+async def invoke_our_graph(agent, st_messages, thread_id=None, deadline_seconds=None):
+
+    # The deadline reaches the LLM and MCP calls through a context variable (see budgets.py)
+    with budgets.request_deadline(deadline_seconds):
+        response = await agent.ainvoke({"messages": st_messages}, config=_thread_config(thread_id))
 
     return response
 
+def summarize_response(messages):
+    """
+    Reduce a finished graph run to what clients actually use: the final text and,
+    if this turn built a playlist, a playlist artifact taken from the tool results:
+
+        {"id", "url", "track_uris", "track_count"}
+
+    Only tracks whose addTracksToPlaylist call succeeded are counted, plus the
+    ones buildLargePlaylist reports in its artifact. Raw search results and
+    other tool payloads are left out.
+    """
+    # Only look at the current turn, i.e. everything after the last user message
+    turn_start = 0
+    for i, msg in enumerate(messages):
+        if isinstance(msg, HumanMessage):
+            turn_start = i
+
+    calls_by_id = {}
+    playlist = None
+    track_uris = []
+    for msg in messages[turn_start:]:
+        if isinstance(msg, AIMessage):
+            for call in msg.tool_calls:
+                calls_by_id[call.get("id")] = call
+        elif isinstance(msg, ToolMessage):
+            if msg.status == "error" or is_error_result(msg.content):
+                continue
+            if msg.name == "createPlaylist":
+                playlist = parse_created_playlist(msg.content) or playlist
+            elif msg.name == BULK_PLAYLIST_TOOL and msg.artifact:
+                playlist = {"id": msg.artifact["id"], "url": msg.artifact["url"]}
+                track_uris.extend(msg.artifact["track_uris"])
+            elif msg.name == "addTracksToPlaylist":
+                args = calls_by_id.get(msg.tool_call_id, {}).get("args", {})
+                track_uris.extend(args.get("trackUris") or [])
+                # Tracks added to an existing playlist still count as a playlist result
+                if playlist is None and args.get("playlistId"):
+                    playlist = {"id": args["playlistId"], "url": playlist_url(args["playlistId"])}
+
+    if playlist is not None:
+        playlist = {**playlist, "track_uris": track_uris, "track_count": len(track_uris)}
+
+    final_text = message_text(messages[-1].content) if messages else ""
+    return {"message": final_text, "playlist": playlist}
+
+async def stream_our_graph(agent, st_messages, thread_id=None, deadline_seconds=None):
+    """
+    Run the graph and yield events as they happen instead of waiting for the final state.
+
+    Yields dicts with a "type" key:
+        token      - a piece of LLM output text ("content")
+        tool_start - a tool call is about to run ("name", "args")
+        tool_end   - a tool call finished ("name")
+        final      - the last message of the run ("content"), plus the
+                     "playlist" artifact from summarize_response
+    """
+    with budgets.request_deadline(deadline_seconds):
+        async for event in _graph_events(agent, st_messages, thread_id):
+            yield event
+
+async def _graph_events(agent, st_messages, thread_id):
+    async for event in agent.astream_events({"messages": st_messages}, config=_thread_config(thread_id), version="v2"):
+        kind = event["event"]
+
+        # Only the assistant's own reply is streamed, not internal calls such as history summaries
+        if kind == "on_chat_model_stream":
+            if event["metadata"].get("langgraph_node") != "assistant" or "internal" in event.get("tags", []):
+                continue
+            text = message_text(event["data"]["chunk"].content)
+            if text:
+                yield {"type": "token", "content": text}
+
+        elif kind == "on_tool_start":
+            yield {"type": "tool_start", "name": event["name"], "args": event["data"].get("input", {})}
+
+        elif kind == "on_tool_end":
+            yield {"type": "tool_end", "name": event["name"]}
+
+        # The root run has no parents; its output is the final graph state
+        elif kind == "on_chain_end" and not event.get("parent_ids"):
+            output = event["data"].get("output") or {}
+            messages = output.get("messages", []) if isinstance(output, dict) else []
+            summary = summarize_response(messages)
+            yield {"type": "final", "content": summary["message"], "playlist": summary["playlist"]}
+
 
 # Example of how to run the function
 
 async def main():
     print("Checking API credentials...\n")
 
-    spotify_valid = check_spotify_credentials()
-    groq_valid = check_groq_credentials()
+    # Both probes run concurrently with a timeout; a recent success is reused from the cache
+    health = await run_health_checks()
+    for check in health["checks"].values():
+        print(f"{'✅' if check['ok'] else '❌'} {check['detail']}{' (cached)' if check['cached'] else ''}")
+    spotify_valid = health["checks"]["spotify"]["ok"]
+    groq_valid = health["checks"]["groq"]["ok"]
 
     print(f"\nCredentials Summary:")
     print(f"Spotify: {'âœ… Valid' if spotify_valid else 'âŒ Invalid'}")
@@ -345,7 +499,7 @@ async def main():
             break
         
         # Invoke the agent with the user's message
-        response = await agent.ainvoke({"messages": [("user", message)]})
+        response = await agent.ainvoke({"messages": [("user", message)]}, config=_thread_config(None))
         
         # Extract and print the assistant's response
         assistant_message = response["messages"][-1].content
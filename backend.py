@@ -1,27 +1,74 @@
 # Step 1: Basic Imports and Setup
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from agent_script import create_graph, invoke_our_graph
+from agent_script import create_graph, invoke_our_graph, stream_our_graph, summarize_response
+from sessions import create_session_store, run_eviction_loop
+from tool_cache import create_tool_cache
+from plan_cache import create_plan_cache
+from track_catalog import create_track_catalog
+from batch import BatchQueue, BatchQueueFull
+from mcp_pool import MCPSessionPool
+from health import run_health_checks
+from metrics import render_metrics
+from rate_limits import batch_priority
 import asyncio
+import json
+import os
+import uuid
 from contextlib import asynccontextmanager
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 
 # Load environment variables (for API keys)
 load_dotenv()
 
 # Step 2: Application Lifecycle Management
+def log_warmup_failure(task):
+    # The pool retries the start on the first tool call, so a failed warmup is only logged
+    if not task.cancelled() and task.exception() is not None:
+        print(f"❌ MCP pool warmup failed: {task.exception()}")
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup: Create the agent when the server starts
     print("Starting up... Creating Spotify agent...")
-    app.state.agent = await create_graph()
+    app.state.sessions = create_session_store()
+    await app.state.sessions.open()
+    app.state.mcp_pool = MCPSessionPool()
+    app.state.tool_cache = create_tool_cache()
+    app.state.plan_cache = create_plan_cache()
+    app.state.track_catalog = create_track_catalog()
+    app.state.agent = await create_graph(checkpointer=app.state.sessions.checkpointer,
+                                         tool_cache=app.state.tool_cache,
+                                         mcp_pool=app.state.mcp_pool,
+                                         plan_cache=app.state.plan_cache,
+                                         track_catalog=app.state.track_catalog)
+    # Warm the MCP servers in the background unless they should start on the first tool call
+    app.state.mcp_warmup = None
+    if os.getenv("MCP_LAZY_CONNECT", "false").lower() not in ("1", "true", "yes"):
+        app.state.mcp_warmup = asyncio.create_task(app.state.mcp_pool.start())
+        app.state.mcp_warmup.add_done_callback(log_warmup_failure)
+    app.state.batch = BatchQueue(run_batch_item)
+    app.state.batch.start()
+    eviction_task = asyncio.create_task(run_eviction_loop(app.state.sessions))
+    health_task = asyncio.create_task(app.state.mcp_pool.run_health_checks())
     print("Agent created successfully!")
     
     yield  # Server is running
     
     # Shutdown: Clean up when server stops
     print("Shutting down...")
+    eviction_task.cancel()
+    health_task.cancel()
+    if app.state.mcp_warmup is not None:
+        # Don't let a warmup still spawning servers race the pool shutdown
+        app.state.mcp_warmup.cancel()
+        await asyncio.gather(app.state.mcp_warmup, return_exceptions=True)
+    await app.state.batch.close()
+    await app.state.mcp_pool.close()
+    await app.state.sessions.close()
+    app.state.track_catalog.close()
 
 # Step 3: Create FastAPI app with lifecycle management
 app = FastAPI(
@@ -32,17 +79,166 @@ app = FastAPI(
 
 # Step 4: Define Request/Response Models
 class ChatQuery(BaseModel):
-    input: List[Dict[str, Any]]
+    # Stateless mode: the whole conversation, resent on every turn
+    input: List[Dict[str, Any]] = []
+    # Session mode: only the new user message; the server keeps the history.
+    # Leave session_id empty on the first turn and reuse the one returned.
+    session_id: Optional[str] = None
+    message: Optional[str] = None
+    # Include the full LangGraph message list (tool calls, raw tool results) in the response
+    verbose: bool = False
+
+class PlaylistArtifact(BaseModel):
+    # Taken from the createPlaylist / addTracksToPlaylist tool results, not from the reply text
+    id: str
+    url: str
+    track_uris: List[str] = []
+    track_count: int = 0
+
+class BatchRequest(BaseModel):
+    prompts: List[str]
+    # Stream each item's result as NDJSON; otherwise return the job id right away and poll /batch/{job_id}
+    stream: bool = True
+
+class ChatResponse(BaseModel):
+    message: str
+    playlist: Optional[PlaylistArtifact] = None
+    session_id: Optional[str] = None
+    messages: Optional[List[Any]] = None
+
+async def start_turn(query: ChatQuery):
+    """Work out the messages to send and the thread to run them in."""
+    if query.message is not None:
+        sessions = app.state.sessions
+        session_id = query.session_id or sessions.new_session_id()
+        await sessions.touch(session_id)
+        return [("human", query.message)], session_id, session_id
+
+    if not query.input:
+        raise HTTPException(status_code=422, detail="Send either 'message' or 'input'")
+
+    # Convert dict messages to tuples format
+    messages = [(msg.get("type", "human"), msg.get("content", "")) for msg in query.input]
+    # A checkpointed graph needs a thread id even for stateless requests, so use a throwaway one
+    thread_id = uuid.uuid4().hex if app.state.agent.checkpointer else None
+    return messages, thread_id, None
+
+async def end_turn(thread_id, session_id):
+    # Throwaway threads from stateless requests are deleted straight away
+    if thread_id and session_id is None:
+        await app.state.agent.checkpointer.adelete_thread(thread_id)
 
 # Step 5: Create API Endpoint (NOT indented under the class)
-@app.post("/chat")
+@app.post("/chat", response_model=ChatResponse, response_model_exclude_none=True)
 async def chat(query: ChatQuery):
     agent = app.state.agent
     if agent is None:
-        return {"error": "Agent not initialized"}
+        raise HTTPException(status_code=503, detail="Agent not initialized")
 
-    # Convert dict messages to tuples format
-    messages = [(msg.get("type", "human"), msg.get("content", "")) for msg in query.input]
-    response = await invoke_our_graph(agent, messages)
-    print(response)
-    return {"response": response}
\ No newline at end of file
+    messages, thread_id, session_id = await start_turn(query)
+    try:
+        response = await invoke_our_graph(agent, messages, thread_id=thread_id)
+    finally:
+        await end_turn(thread_id, session_id)
+    result = summarize_response(response["messages"])
+    result["session_id"] = session_id
+    if query.verbose:
+        result["messages"] = response["messages"]
+    return result
+
+# Step 6: Streaming variant of /chat (newline-delimited JSON, one event per line)
+@app.post("/chat/stream")
+async def chat_stream(query: ChatQuery):
+    agent = app.state.agent
+    if agent is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+
+    messages, thread_id, session_id = await start_turn(query)
+
+    async def event_lines():
+        if session_id:
+            yield json.dumps({"type": "session", "session_id": session_id}) + "\n"
+        try:
+            async for event in stream_our_graph(agent, messages, thread_id=thread_id):
+                yield json.dumps(event, default=str) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "content": str(e)}) + "\n"
+        finally:
+            await end_turn(thread_id, session_id)
+
+    return StreamingResponse(event_lines(), media_type="application/x-ndjson")
+
+# Step 7: Cache statistics (hit rate and time saved) for tool results, playlist plans and the track catalog
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "tools": app.state.tool_cache.stats(),
+        "plans": app.state.plan_cache.stats(),
+        "catalog": app.state.track_catalog.stats(),
+    }
+
+
+# Step 8: Health check for load balancers (Spotify and Groq credentials, cached for HEALTH_CACHE_TTL_SECONDS)
+@app.get("/health")
+async def health():
+    result = await run_health_checks()
+    return JSONResponse(result, status_code=200 if result["ok"] else 503)
+
+
+# Step 9: Prometheus metrics (graph runs, node timings, LLM latency and tokens, tool latency)
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+# Step 10: Batch playlist generation over a bounded job queue (BATCH_CONCURRENCY items at a time)
+async def run_batch_item(prompt):
+    agent = app.state.agent
+    # Each item is its own stateless conversation
+    thread_id = uuid.uuid4().hex if agent.checkpointer else None
+    # Interactive /chat requests get Spotify and Groq capacity before batch items
+    with batch_priority():
+        try:
+            response = await invoke_our_graph(agent, [("human", prompt)], thread_id=thread_id)
+        finally:
+            await end_turn(thread_id, None)
+    return summarize_response(response["messages"])
+
+def get_batch_job(job_id):
+    job = app.state.batch.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown batch job")
+    return job
+
+@app.post("/batch")
+async def batch(query: BatchRequest):
+    if app.state.agent is None:
+        raise HTTPException(status_code=503, detail="Agent not initialized")
+    if not query.prompts:
+        raise HTTPException(status_code=422, detail="Send at least one prompt")
+    try:
+        job = app.state.batch.submit(query.prompts)
+    except BatchQueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+
+    if not query.stream:
+        return JSONResponse(job.summary(include_results=False), status_code=202)
+
+    async def event_lines():
+        # The job keeps running if the client goes away; its results stay available at /batch/{job_id}
+        yield json.dumps({"type": "job", **job.summary(include_results=False)}) + "\n"
+        async for result in job.stream():
+            yield json.dumps({"type": "item", **result}, default=str) + "\n"
+        yield json.dumps({"type": "done", **job.summary(include_results=False)}) + "\n"
+
+    return StreamingResponse(event_lines(), media_type="application/x-ndjson")
+
+@app.get("/batch/{job_id}")
+async def batch_status(job_id: str):
+    return get_batch_job(job_id).summary()
+
+@app.delete("/batch/{job_id}")
+async def cancel_batch(job_id: str):
+    job = get_batch_job(job_id)
+    await job.cancel()
+    return job.summary(include_results=False)
@@ -0,0 +1,170 @@
+"""
+Bounded job queue for generating many playlists at once (the /batch API).
+
+A job is a list of prompts. Every prompt becomes one queue item, and a fixed
+pool of workers runs items from all jobs over the shared agent, so at most
+BATCH_CONCURRENCY graph runs are in flight no matter how many jobs are queued.
+Results are recorded per item as they finish and can be streamed, polled or
+cut short by cancelling the job.
+
+Settings:
+    BATCH_CONCURRENCY        - items run at the same time
+    BATCH_MAX_QUEUED_ITEMS   - items waiting across all jobs; more are refused
+    BATCH_MAX_FINISHED_JOBS  - finished jobs kept around for polling
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+DEFAULT_BATCH_CONCURRENCY = 4
+DEFAULT_BATCH_MAX_QUEUED_ITEMS = 1000
+DEFAULT_BATCH_MAX_FINISHED_JOBS = 100
+
+
+class BatchQueueFull(Exception):
+    """The queue can't take this many more items right now."""
+
+
+class BatchJob:
+    def __init__(self, prompts):
+        self.id = uuid.uuid4().hex
+        self.prompts = list(prompts)
+        self.results = [None] * len(self.prompts)
+        # Indexes in the order their items finished, so streams can pick up where they left off
+        self.finished_order = []
+        self.status = "queued"
+        self.cancelled = False
+        self.created_at = time.time()
+        self.finished_at = None
+        self._running = {}
+        self._changed = asyncio.Condition()
+
+    @property
+    def done(self):
+        return len(self.finished_order) == len(self.prompts)
+
+    async def _record(self, index, result):
+        self._running.pop(index, None)
+        self.results[index] = {"index": index, "prompt": self.prompts[index], **result}
+        self.finished_order.append(index)
+        if self.done:
+            self.status = "cancelled" if self.cancelled else "completed"
+            self.finished_at = time.time()
+        async with self._changed:
+            self._changed.notify_all()
+
+    def counts(self):
+        counts = {"total": len(self.prompts), "ok": 0, "error": 0, "cancelled": 0}
+        for index in self.finished_order:
+            counts[self.results[index]["status"]] += 1
+        counts["pending"] = counts["total"] - len(self.finished_order)
+        return counts
+
+    def summary(self, include_results=True):
+        summary = {
+            "job_id": self.id,
+            "status": self.status,
+            "counts": self.counts(),
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+        }
+        if include_results:
+            summary["results"] = [result for result in self.results if result is not None]
+        return summary
+
+    async def cancel(self):
+        """Skip the items still queued and stop the ones running."""
+        if self.done:
+            return
+        self.cancelled = True
+        for task in list(self._running.values()):
+            task.cancel()
+
+    async def stream(self):
+        """Yield each item's result as it finishes, then return once the job is done."""
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.finished_order) > sent)
+            for index in self.finished_order[sent:]:
+                yield self.results[index]
+            sent = len(self.finished_order)
+            if self.done:
+                return
+
+
+class BatchQueue:
+    def __init__(self, run_item, concurrency=None, max_queued_items=None, max_finished_jobs=None):
+        """run_item(prompt) runs one prompt and returns a dict (see summarize_response)."""
+        self.run_item = run_item
+        if concurrency is None:
+            concurrency = int(os.getenv("BATCH_CONCURRENCY", DEFAULT_BATCH_CONCURRENCY))
+        if max_queued_items is None:
+            max_queued_items = int(os.getenv("BATCH_MAX_QUEUED_ITEMS", DEFAULT_BATCH_MAX_QUEUED_ITEMS))
+        if max_finished_jobs is None:
+            max_finished_jobs = int(os.getenv("BATCH_MAX_FINISHED_JOBS", DEFAULT_BATCH_MAX_FINISHED_JOBS))
+        self.concurrency = concurrency
+        self.max_finished_jobs = max_finished_jobs
+        self._queue = asyncio.Queue(maxsize=max_queued_items)
+        self._workers = []
+        self.jobs = OrderedDict()
+
+    def start(self):
+        if not self._workers:
+            self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+
+    async def close(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, prompts):
+        """Queue a job, or raise BatchQueueFull if its items don't fit."""
+        if self._queue.maxsize and self._queue.qsize() + len(prompts) > self._queue.maxsize:
+            raise BatchQueueFull(f"queue has room for {self._queue.maxsize - self._queue.qsize()} more items")
+        self.start()
+        job = BatchJob(prompts)
+        self.jobs[job.id] = job
+        for index in range(len(job.prompts)):
+            self._queue.put_nowait((job, index))
+        self._prune()
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    async def _run(self, job, index):
+        if job.cancelled:
+            await job._record(index, {"status": "cancelled"})
+            return
+        job.status = "running"
+        task = asyncio.create_task(self.run_item(job.prompts[index]))
+        job._running[index] = task
+        try:
+            result = await task
+        except asyncio.CancelledError:
+            # Shutting the worker down is not the same as cancelling the job
+            if asyncio.current_task().cancelling() or not job.cancelled:
+                raise
+            await job._record(index, {"status": "cancelled"})
+        except Exception as e:
+            print(f"❌ Batch item {index} of job {job.id} failed: {e}")
+            await job._record(index, {"status": "error", "error": str(e)})
+        else:
+            await job._record(index, {"status": "ok", **result})
+
+    async def _worker(self):
+        while True:
+            job, index = await self._queue.get()
+            try:
+                await self._run(job, index)
+            finally:
+                self._queue.task_done()
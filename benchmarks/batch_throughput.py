@@ -0,0 +1,68 @@
+"""
+Throughput of the /batch endpoint as BATCH_CONCURRENCY grows.
+
+Runs the real FastAPI app in-process with a fake LLM and fake Spotify tools and
+submits one streamed batch per concurrency level. Items/second should scale
+with concurrency until LLM_MAX_CONCURRENCY is reached.
+
+    python benchmarks/batch_throughput.py --concurrency 1 2 4 8 16 --items 32
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_script import create_graph  # noqa: E402
+from backend import app, run_batch_item  # noqa: E402
+from batch import BatchQueue  # noqa: E402
+from benchmarks.fakes import FakePlaylistLLM, make_fake_tools  # noqa: E402
+from tool_cache import ToolResultCache  # noqa: E402
+
+
+async def run_level(client, concurrency, items):
+    app.state.batch = BatchQueue(run_batch_item, concurrency=concurrency)
+    prompts = [f"make me a lofi study playlist number {i}" for i in range(items)]
+
+    start = time.perf_counter()
+    counts = None
+    async with client.stream("POST", "/batch", json={"prompts": prompts}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            event = json.loads(line)
+            if event["type"] == "done":
+                counts = event["counts"]
+    elapsed = time.perf_counter() - start
+    await app.state.batch.close()
+    return elapsed, counts
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--items", type=int, default=32, help="prompts per batch")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--tool-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    app.state.agent = await create_graph(
+        llm=FakePlaylistLLM(latency=args.llm_latency),
+        tools=make_fake_tools(args.tool_latency),
+        tool_cache=ToolResultCache(max_entries=0),
+    )
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print(f"{'concurrency':>12} {'items':>6} {'ok':>4} {'seconds':>8} {'items/s':>8}")
+        for concurrency in args.concurrency:
+            elapsed, counts = await run_level(client, concurrency, args.items)
+            print(f"{concurrency:>12} {args.items:>6} {counts['ok']:>4} {elapsed:>8.2f} {args.items / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
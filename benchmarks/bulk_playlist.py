@@ -0,0 +1,67 @@
+"""
+Time to build large playlists with the buildLargePlaylist tool.
+
+Runs the tool against the fake Spotify tools (each call sleeps --latency
+seconds) for several playlist sizes, once with one search page at a time and
+once with BULK_SEARCH_CONCURRENCY pages in flight, and counts the Spotify
+calls each build made.
+
+    python benchmarks/bulk_playlist.py --sizes 100 500 1000 --queries 4
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import make_fake_tools  # noqa: E402
+from bulk_playlist import DEFAULT_BULK_SEARCH_CONCURRENCY, create_bulk_playlist_tool  # noqa: E402
+
+QUERIES = ["lofi study", "jazz hop", "chillhop", "ambient focus", "piano instrumental", "rainy day"]
+
+
+def count_calls(tools, calls):
+    """Wrap each fake tool's coroutine so its calls are counted."""
+    for tool in tools:
+        coroutine = tool.coroutine
+
+        async def counted(*args, _name=tool.name, _coroutine=coroutine, **kwargs):
+            calls[_name] += 1
+            return await _coroutine(*args, **kwargs)
+
+        tool.coroutine = counted
+    return tools
+
+
+async def run(size, queries, concurrency, latency):
+    calls = Counter()
+    tool = create_bulk_playlist_tool(count_calls(make_fake_tools(latency), calls), concurrency=concurrency)
+    started = time.perf_counter()
+    message = await tool.ainvoke({
+        "type": "tool_call", "id": "bench", "name": tool.name,
+        "args": {"name": "Bench", "queries": queries, "size": size},
+    })
+    return time.perf_counter() - started, len(message.artifact["track_uris"]), calls
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000])
+    parser.add_argument("--queries", type=int, default=4, help=f"search queries per playlist (max {len(QUERIES)})")
+    parser.add_argument("--latency", type=float, default=0.1, help="seconds per fake Spotify call")
+    args = parser.parse_args()
+
+    queries = QUERIES[:args.queries]
+    print(f"{'size':>6} {'concurrency':>12} {'tracks':>7} {'searches':>9} {'adds':>5} {'seconds':>8}")
+    for size in args.sizes:
+        for concurrency in (1, DEFAULT_BULK_SEARCH_CONCURRENCY):
+            elapsed, tracks, calls = await run(size, queries, concurrency, args.latency)
+            print(f"{size:>6} {concurrency:>12} {tracks:>7} {calls['searchSpotify']:>9} "
+                  f"{calls['addTracksToPlaylist']:>5} {elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
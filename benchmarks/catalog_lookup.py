@@ -0,0 +1,68 @@
+"""
+Lookup latency of the local track catalog as it grows.
+
+Fills a throwaway catalog with synthetic tracks tagged with genres and moods,
+then times searches of different breadth (one common genre, two moods, an
+artist) at each size. Lookups should stay well under a millisecond.
+
+    python benchmarks/catalog_lookup.py --sizes 1000 10000 100000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from track_catalog import TrackCatalog  # noqa: E402
+
+TAGS = ("rock pop jazz lofi chill study sad happy workout party indie folk metal soul funk house techno ambient "
+        "acoustic focus sleep").split()
+QUERIES = ["jazz", "chill study", "artist 42", "sad acoustic sleep"]
+
+
+def fill(catalog, start, stop, rng):
+    tracks = [
+        {"uri": f"spotify:track:{i:022d}", "name": f"Track {i}", "artist": f"Artist {i % 5000}",
+         "tags": " ".join(rng.sample(TAGS, 3))}
+        for i in range(start, stop)
+    ]
+    for i in range(0, len(tracks), 1000):
+        catalog.add(tracks[i:i + 1000])
+
+
+def time_query(catalog, query, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        catalog.search(query, 10)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeats", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        catalog = TrackCatalog(os.path.join(directory, "tracks.db"), max_tracks=max(args.sizes))
+        print(f"{'tracks':>8} {'query':<22} {'p50 ms':>8} {'p95 ms':>8}")
+        filled = 0
+        for size in sorted(args.sizes):
+            fill(catalog, filled, size, rng)
+            filled = size
+            for query in QUERIES:
+                p50, p95 = time_query(catalog, query, args.repeats)
+                print(f"{size:>8} {query:<22} {p50:>8.3f} {p95:>8.3f}")
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Offline stand-ins for Groq and the Spotify MCP server.
+
+FakePlaylistLLM walks the same search -> createPlaylist -> addTracksToPlaylist
+workflow the system prompt asks for, deciding each step from the last message
+so concurrent conversations never interfere with each other. The fake tools
+sleep for a configurable latency and return Spotify-shaped JSON.
+"""
+import asyncio
+import hashlib
+import json
+import uuid
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import StructuredTool
+from pydantic import Field
+
+from spotify_results import parse_created_playlist, parse_search_tracks
+
+
+class FakePlaylistLLM(BaseChatModel):
+    """Scripted chat model that builds a playlist in four LLM hops."""
+
+    latency: float = 0.2
+    songs: int = 10
+    bound_tools: list = []
+    # Shared with every bind_tools() copy, so one counter covers the whole graph
+    stats: dict = Field(default_factory=lambda: {"calls": 0})
+
+    @property
+    def _llm_type(self):
+        return "fake-playlist"
+
+    def bind_tools(self, tools, **kwargs):
+        names = [getattr(t, "name", None) or getattr(t, "__name__", None) or t.get("name") for t in tools]
+        return self.model_copy(update={"bound_tools": names})
+
+    def _next_message(self, messages):
+        self.stats["calls"] += 1
+        last = messages[-1]
+        call_id = f"call_{uuid.uuid4().hex[:8]}"
+
+        # Planner mode asks for a structured PlaylistPlan through a single forced tool call
+        if "PlaylistPlan" in self.bound_tools:
+            return AIMessage(content="", tool_calls=[{
+                "name": "PlaylistPlan",
+                "args": {"is_playlist_request": True, "queries": ["lofi study"], "playlist_name": "Lofi Study",
+                         "description": "Benchmark playlist", "size": self.songs},
+                "id": call_id,
+            }])
+
+        if not isinstance(last, ToolMessage):
+            return AIMessage(content="", tool_calls=[{
+                "name": "searchSpotify",
+                "args": {"query": "lofi study", "type": "track", "limit": self.songs},
+                "id": call_id,
+            }])
+
+        if last.name == "searchSpotify":
+            return AIMessage(content="", tool_calls=[{
+                "name": "createPlaylist",
+                "args": {"name": "Lofi Study", "description": "Benchmark playlist", "public": False},
+                "id": call_id,
+            }])
+
+        if last.name == "createPlaylist":
+            # Parse like the agent does, so both the JSON fakes and the stub MCP server's text work
+            playlist = parse_created_playlist(last.content)
+            search = next(m for m in reversed(messages) if isinstance(m, ToolMessage) and m.name == "searchSpotify")
+            uris = [track["uri"] for track in parse_search_tracks(search.content)][:self.songs]
+            return AIMessage(content="", tool_calls=[{
+                "name": "addTracksToPlaylist",
+                "args": {"playlistId": playlist["id"], "trackUris": uris},
+                "id": call_id,
+            }])
+
+        playlist_id = next(parse_created_playlist(m.content)["id"] for m in reversed(messages)
+                           if isinstance(m, ToolMessage) and m.name == "createPlaylist")
+        lines = [f"{i + 1}. Fake Song {i} - Fake Artist" for i in range(self.songs)]
+        return AIMessage(content="I've created your playlist!\n" + "\n".join(lines)
+                         + f"\nListen here: https://open.spotify.com/playlist/{playlist_id}")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        # Non-blocking wait, like a real HTTP call to Groq
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._next_message(messages))])
+
+
+def make_fake_tools(latency=0.05):
+    """Return in-process searchSpotify / createPlaylist / addTracksToPlaylist tools."""
+
+    async def searchSpotify(query: str, type: str = "track", limit: int = 10, offset: int = 0) -> str:
+        await asyncio.sleep(latency)
+        # Stable per query, so different searches return different tracks
+        prefix = hashlib.sha1(query.encode()).hexdigest()[:8]
+        return json.dumps([
+            {"name": f"Fake Song {offset + i}", "artists": [f"Fake Artist {prefix}"],
+             "uri": f"spotify:track:{prefix}{offset + i:04d}"}
+            for i in range(limit)
+        ])
+
+    async def createPlaylist(name: str, description: str = "", public: bool = False) -> str:
+        await asyncio.sleep(latency)
+        playlist_id = uuid.uuid4().hex[:22]
+        return json.dumps({
+            "id": playlist_id,
+            "name": name,
+            "external_urls": {"spotify": f"https://open.spotify.com/playlist/{playlist_id}"},
+        })
+
+    async def addTracksToPlaylist(playlistId: str, trackUris: list[str]) -> str:
+        await asyncio.sleep(latency)
+        return f"Successfully added {len(trackUris)} tracks to playlist {playlistId}"
+
+    return [
+        StructuredTool.from_function(coroutine=searchSpotify, name="searchSpotify",
+                                     description="Search Spotify for tracks"),
+        StructuredTool.from_function(coroutine=createPlaylist, name="createPlaylist",
+                                     description="Create a new playlist"),
+        StructuredTool.from_function(coroutine=addTracksToPlaylist, name="addTracksToPlaylist",
+                                     description="Add tracks to a playlist"),
+    ]
@@ -0,0 +1,67 @@
+"""
+Load test for the /chat endpoint.
+
+Runs the real FastAPI app in-process with a fake LLM and fake Spotify tools,
+then measures throughput as the number of concurrent clients grows. With an
+async assistant node, requests/second should scale roughly linearly until
+LLM_MAX_CONCURRENCY is reached.
+
+    python benchmarks/load_chat.py --clients 1 2 4 8 16 --requests 32
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_script import create_graph  # noqa: E402
+from backend import app  # noqa: E402
+from benchmarks.fakes import FakePlaylistLLM, make_fake_tools  # noqa: E402
+
+
+async def run_level(client, clients, total_requests):
+    payload = {"input": [{"type": "human", "content": "make me a lofi study playlist"}]}
+    queue = asyncio.Queue()
+    for _ in range(total_requests):
+        queue.put_nowait(payload)
+
+    async def worker():
+        while not queue.empty():
+            body = queue.get_nowait()
+            response = await client.post("/chat", json=body)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--tool-latency", type=float, default=0.05)
+    parser.add_argument("--max-llm-concurrency", type=int, default=None)
+    args = parser.parse_args()
+
+    app.state.agent = await create_graph(
+        llm=FakePlaylistLLM(latency=args.llm_latency),
+        tools=make_fake_tools(args.tool_latency),
+        max_llm_concurrency=args.max_llm_concurrency,
+    )
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        print(f"{'clients':>8} {'requests':>9} {'seconds':>8} {'req/s':>8}")
+        for clients in args.clients:
+            elapsed = await run_level(client, clients, args.requests)
+            print(f"{clients:>8} {args.requests:>9} {elapsed:>8.2f} {args.requests / elapsed:>8.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+"""
+Compare playlist latency with one model against routing the cheap steps to a small one.
+
+Both runs use FakePlaylistLLM and the fake Spotify tools. The single-model run
+does all four LLM hops on the large model; the routed run uses the default
+MODEL_ROUTES (plan on the large model, tool_args and summary on the small
+one). The fakes never send invalid tool calls, so nothing escalates here.
+
+    python benchmarks/model_routing.py --playlists 10 --large-latency 0.8 --small-latency 0.2
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_script import create_graph, invoke_our_graph, summarize_response  # noqa: E402
+from benchmarks.fakes import FakePlaylistLLM, make_fake_tools  # noqa: E402
+
+
+async def run(args, routed):
+    large = FakePlaylistLLM(latency=args.large_latency, songs=args.songs)
+    small = FakePlaylistLLM(latency=args.small_latency, songs=args.songs) if routed else None
+    graph = await create_graph(llm=large, small_llm=small, tools=make_fake_tools(args.tool_latency),
+                               planner_mode=False, model_routes={})
+
+    latencies = []
+    for _ in range(args.playlists):
+        start = time.perf_counter()
+        response = await invoke_our_graph(graph, [("user", "make me a lofi study playlist")])
+        latencies.append(time.perf_counter() - start)
+        if summarize_response(response["messages"])["playlist"] is None:
+            raise RuntimeError("run finished without creating a playlist")
+    calls = (large.stats["calls"] / args.playlists, small.stats["calls"] / args.playlists if small else 0.0)
+    return calls, latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--playlists", type=int, default=10)
+    parser.add_argument("--songs", type=int, default=10)
+    parser.add_argument("--large-latency", type=float, default=0.8)
+    parser.add_argument("--small-latency", type=float, default=0.2)
+    parser.add_argument("--tool-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(f"{'models':>8} {'large calls':>12} {'small calls':>12} {'p50 s':>7} {'mean s':>7}")
+    for routed in (False, True):
+        (large_calls, small_calls), latencies = await run(args, routed)
+        print(f"{'routed' if routed else 'single':>8} {large_calls:>12.1f} {small_calls:>12.1f} "
+              f"{statistics.median(latencies):>7.2f} {statistics.mean(latencies):>7.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,55 @@
+"""
+Compare LLM calls and latency per playlist between the ReAct loop and planner mode.
+
+Both graphs use the same fake LLM and fake Spotify tools, so the difference
+comes only from the number of LLM round-trips each mode needs.
+
+    python benchmarks/planner_vs_react.py --playlists 10 --llm-latency 0.5
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_script import create_graph, invoke_our_graph, summarize_response  # noqa: E402
+from benchmarks.fakes import FakePlaylistLLM, make_fake_tools  # noqa: E402
+
+
+async def run_mode(planner_mode, args):
+    llm = FakePlaylistLLM(latency=args.llm_latency, songs=args.songs)
+    graph = await create_graph(llm=llm, tools=make_fake_tools(args.tool_latency), planner_mode=planner_mode)
+
+    latencies = []
+    for i in range(args.playlists):
+        start = time.perf_counter()
+        response = await invoke_our_graph(graph, [("user", "make me a lofi study playlist")])
+        latencies.append(time.perf_counter() - start)
+        if summarize_response(response["messages"])["playlist"] is None:
+            raise RuntimeError("run finished without creating a playlist")
+
+    return llm.stats["calls"] / args.playlists, latencies
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--playlists", type=int, default=10)
+    parser.add_argument("--songs", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    parser.add_argument("--tool-latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    # Every run searches for the same thing; keep the tool cache from hiding search latency
+    os.environ.setdefault("TOOL_CACHE_MAX_ENTRIES", "0")
+
+    print(f"{'mode':>8} {'LLM calls':>10} {'p50 s':>7} {'mean s':>7}")
+    for name, planner_mode in (("react", False), ("planner", True)):
+        calls, latencies = await run_mode(planner_mode, args)
+        print(f"{name:>8} {calls:>10.1f} {statistics.median(latencies):>7.2f} {statistics.mean(latencies):>7.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
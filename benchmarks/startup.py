@@ -0,0 +1,72 @@
+"""
+Startup-time benchmark for create_graph.
+
+Builds the graph against the stub MCP server twice: once with an empty tool
+schema cache (the server must be started and its tools discovered) and once
+with a warm cache (tools come from disk and the server starts on first use).
+
+    python benchmarks/startup.py --runs 3
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agent_script import create_graph  # noqa: E402
+from benchmarks.fakes import FakePlaylistLLM  # noqa: E402
+from mcp_pool import MCPSessionPool  # noqa: E402
+
+
+def write_stub_config(directory, latency=None):
+    """mcp_use config that runs stub_mcp_server.py, optionally with a given per-call latency."""
+    path = os.path.join(directory, "mcp_config.json")
+    server_config = {"command": sys.executable, "args": [os.path.join(ROOT, "benchmarks", "stub_mcp_server.py")]}
+    if latency is not None:
+        # stdio servers don't inherit our environment, so pass the setting explicitly
+        server_config["env"] = {"STUB_MCP_LATENCY": str(latency)}
+    with open(path, "w") as f:
+        json.dump({"mcpServers": {"spotify": server_config}}, f)
+    return path
+
+
+async def time_startup(config_file, pool_size):
+    pool = MCPSessionPool(config_file=config_file, size=pool_size)
+    start = time.perf_counter()
+    await create_graph(llm=FakePlaylistLLM(), mcp_pool=pool)
+    elapsed = time.perf_counter() - start
+    await pool.close()
+    return elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--pool-size", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        config_file = write_stub_config(directory)
+        cache_path = os.path.join(directory, "mcp_tools.json")
+        os.environ["MCP_SCHEMA_CACHE_PATH"] = cache_path
+
+        cold, warm = [], []
+        for _ in range(args.runs):
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            cold.append(await time_startup(config_file, args.pool_size))
+            warm.append(await time_startup(config_file, args.pool_size))
+
+    print(f"{'schema cache':>13} {'median s':>9} {'min s':>7}")
+    print(f"{'cold':>13} {statistics.median(cold):>9.3f} {min(cold):>7.3f}")
+    print(f"{'warm':>13} {statistics.median(warm):>9.3f} {min(warm):>7.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
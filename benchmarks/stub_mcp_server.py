@@ -0,0 +1,53 @@
+"""
+Stand-in for spotify-mcp-server that needs no network or Spotify account.
+
+Implements searchSpotify, createPlaylist and addTracksToPlaylist with the same
+text responses as the real server. Each call sleeps STUB_MCP_LATENCY seconds.
+
+    python benchmarks/stub_mcp_server.py      # stdio MCP server
+"""
+import asyncio
+import hashlib
+import os
+import uuid
+
+from mcp.server.fastmcp import FastMCP
+
+LATENCY = float(os.getenv("STUB_MCP_LATENCY", "0.05"))
+
+mcp = FastMCP("stub-spotify")
+
+
+def _track_id(query, i):
+    # Stable 22-character ids, so the same search always returns the same tracks
+    return hashlib.sha1(f"{query}:{i}".encode()).hexdigest()[:22]
+
+
+@mcp.tool()
+async def searchSpotify(query: str, type: str = "track", limit: int = 10, offset: int = 0) -> str:
+    """Search for tracks, albums, artists, or playlists on Spotify"""
+    await asyncio.sleep(LATENCY)
+    lines = [
+        f'{i + 1}. "{query.title()} Song {offset + i}" by Stub Artist {i % 3} (3:{i % 60:02d})'
+        f' - ID: {_track_id(query, offset + i)}'
+        for i in range(limit)
+    ]
+    return f'# Search results for "{query}" (type: {type})\n\n' + "\n".join(lines)
+
+
+@mcp.tool()
+async def createPlaylist(name: str, description: str = "", public: bool = False) -> str:
+    """Create a new playlist on Spotify"""
+    await asyncio.sleep(LATENCY)
+    return f'Successfully created playlist "{name}"\nPlaylist ID: {uuid.uuid4().hex[:22]}'
+
+
+@mcp.tool()
+async def addTracksToPlaylist(playlistId: str, trackUris: list[str], position: int | None = None) -> str:
+    """Add tracks to a Spotify playlist"""
+    await asyncio.sleep(LATENCY)
+    return f"Successfully added {len(trackUris)} track{'s' if len(trackUris) != 1 else ''} to playlist (id: {playlistId})"
+
+
+if __name__ == "__main__":
+    mcp.run()
@@ -0,0 +1,232 @@
+"""
+Offline performance suite for the agent, for catching regressions before a deploy.
+
+Needs no network: the LLM is FakePlaylistLLM and the tools run either on the
+stub MCP server (a real stdio hop through MCPSessionPool) or in-process.
+Three scenarios are measured:
+
+    graph   - create_graph / invoke_our_graph at each concurrency level
+    chat    - the FastAPI /chat endpoint (session mode) at each concurrency level
+    memory  - retained memory per server-side session, measured with tracemalloc
+
+Latencies are reported as p50/p95 with requests per second. Save the results
+with --save and compare a later run against them with --baseline; the run
+fails if any p95 got more than --max-regression slower or rps dropped by as much.
+
+    python benchmarks/suite.py --clients 1 4 16 --requests 32 --save baseline.json
+    python benchmarks/suite.py --clients 1 4 16 --requests 32 --baseline baseline.json
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from agent_script import create_graph, invoke_our_graph  # noqa: E402
+from backend import app  # noqa: E402
+from benchmarks.fakes import FakePlaylistLLM, make_fake_tools  # noqa: E402
+from benchmarks.startup import write_stub_config  # noqa: E402
+from mcp_pool import MCPSessionPool  # noqa: E402
+from sessions import InMemorySessionStore  # noqa: E402
+from tool_cache import ToolResultCache  # noqa: E402
+
+PROMPT = "make me a lofi study playlist"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(latencies, elapsed):
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "rps": round(len(latencies) / elapsed, 2),
+    }
+
+
+async def run_clients(clients, total_requests, request):
+    """Run total_requests calls of request() spread over `clients` concurrent workers."""
+    remaining = iter(range(total_requests))
+    latencies = []
+
+    async def worker():
+        for i in remaining:
+            start = time.perf_counter()
+            await request(i)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def build_agent(args, checkpointer=None, mcp_pool=None):
+    llm = FakePlaylistLLM(latency=args.llm_latency, songs=args.songs)
+    # No tool caching, so every request pays the full tool latency
+    no_cache = ToolResultCache(max_entries=0)
+    if mcp_pool is not None:
+        return await create_graph(llm=llm, mcp_pool=mcp_pool, checkpointer=checkpointer, tool_cache=no_cache)
+    return await create_graph(llm=llm, tools=make_fake_tools(args.tool_latency),
+                              checkpointer=checkpointer, tool_cache=no_cache)
+
+
+async def bench_graph(args, mcp_pool):
+    agent = await build_agent(args, mcp_pool=mcp_pool)
+    results = {}
+    for clients in args.clients:
+        results[str(clients)] = await run_clients(
+            clients, args.requests, lambda i: invoke_our_graph(agent, [("user", PROMPT)])
+        )
+    return results
+
+
+async def bench_chat(args, mcp_pool):
+    sessions = InMemorySessionStore()
+    await sessions.open()
+    app.state.sessions = sessions
+    app.state.agent = await build_agent(args, checkpointer=sessions.checkpointer, mcp_pool=mcp_pool)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def request(i):
+            response = await client.post("/chat", json={"message": PROMPT})
+            response.raise_for_status()
+
+        for clients in args.clients:
+            results[str(clients)] = await run_clients(clients, args.requests, request)
+    await sessions.close()
+    return results
+
+
+async def bench_memory(args):
+    """Memory kept per session: one playlist turn in each of args.sessions new sessions."""
+    sessions = InMemorySessionStore()
+    await sessions.open()
+    app.state.sessions = sessions
+    # Latency doesn't matter here, only what each finished session leaves behind
+    args_fast = argparse.Namespace(**{**vars(args), "llm_latency": 0, "tool_latency": 0})
+    app.state.agent = await build_agent(args_fast, checkpointer=sessions.checkpointer)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def new_session():
+            response = await client.post("/chat", json={"message": PROMPT})
+            response.raise_for_status()
+
+        # Warm up imports, caches and the connection before measuring
+        await new_session()
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for _ in range(args.sessions):
+            await new_session()
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+    retained = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    await sessions.close()
+    return {"sessions": args.sessions, "bytes_per_session": retained // args.sessions}
+
+
+def print_latency_table(title, results):
+    print(f"\n{title}")
+    print(f"{'clients':>8} {'requests':>9} {'p50 ms':>8} {'p95 ms':>8} {'req/s':>8}")
+    for clients, r in results.items():
+        print(f"{clients:>8} {r['requests']:>9} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['rps']:>8.2f}")
+
+
+def compare(results, baseline, max_regression):
+    """Return a list of regressions beyond max_regression compared to the baseline results."""
+    problems = []
+    for scenario in ("graph", "chat"):
+        for clients, now in results.get(scenario, {}).items():
+            before = baseline.get(scenario, {}).get(clients)
+            if not before:
+                continue
+            if now["p95_ms"] > before["p95_ms"] * (1 + max_regression):
+                problems.append(f"{scenario} @ {clients} clients: p95 {before['p95_ms']} -> {now['p95_ms']} ms")
+            if now["rps"] < before["rps"] * (1 - max_regression):
+                problems.append(f"{scenario} @ {clients} clients: rps {before['rps']} -> {now['rps']}")
+    memory_now, memory_before = results.get("memory"), baseline.get("memory")
+    if memory_now and memory_before:
+        if memory_now["bytes_per_session"] > memory_before["bytes_per_session"] * (1 + max_regression):
+            problems.append(f"memory: {memory_before['bytes_per_session']} -> "
+                            f"{memory_now['bytes_per_session']} bytes per session")
+    return problems
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=["graph", "chat", "memory"],
+                        default=["graph", "chat", "memory"])
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=32, help="requests per concurrency level")
+    parser.add_argument("--sessions", type=int, default=200, help="sessions created for the memory scenario")
+    parser.add_argument("--songs", type=int, default=10)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--tool-latency", type=float, default=0.05)
+    parser.add_argument("--tools", choices=["stub-mcp", "in-process"], default="stub-mcp",
+                        help="run tools on the stub MCP server over stdio, or as in-process fakes")
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved earlier with --save")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = {"settings": {k: v for k, v in vars(args).items() if k not in ("save", "baseline")}}
+    with tempfile.TemporaryDirectory() as directory:
+        mcp_pool = None
+        if args.tools == "stub-mcp":
+            os.environ["MCP_SCHEMA_CACHE_PATH"] = os.path.join(directory, "mcp_tools.json")
+            mcp_pool = MCPSessionPool(config_file=write_stub_config(directory, args.tool_latency),
+                                      size=args.pool_size)
+            await mcp_pool.start()
+        try:
+            if "graph" in args.scenarios:
+                results["graph"] = await bench_graph(args, mcp_pool)
+                print_latency_table("invoke_our_graph", results["graph"])
+            if "chat" in args.scenarios:
+                results["chat"] = await bench_chat(args, mcp_pool)
+                print_latency_table("POST /chat", results["chat"])
+        finally:
+            if mcp_pool is not None:
+                await mcp_pool.close()
+
+    if "memory" in args.scenarios:
+        results["memory"] = await bench_memory(args)
+        print(f"\nmemory: {results['memory']['bytes_per_session'] / 1024:.1f} KiB per session "
+              f"({results['memory']['sessions']} sessions)")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(results, json.load(f), args.max_regression)
+        if problems:
+            print("\n❌ Regressions against the baseline:")
+            for problem in problems:
+                print(f"   {problem}")
+            sys.exit(1)
+        print("\n✅ No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
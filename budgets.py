@@ -0,0 +1,79 @@
+"""
+Per-request limits on how much work one chat turn may do.
+
+- iterations: assistant turns (LLM calls) within one user turn
+- tool calls: tool calls within one user turn
+- deadline: wall-clock time for the whole request
+
+The deadline lives in a context variable set around each graph run, so it
+reaches the LLM calls in the assistant and planner nodes and the MCP calls in
+MCPSessionPool without being threaded through every signature. When a budget
+runs out the assistant stops and answers with what it has done so far.
+
+Settings:
+    AGENT_MAX_ITERATIONS     - assistant turns per request (0 = unlimited)
+    AGENT_MAX_TOOL_CALLS     - tool calls per request (0 = unlimited)
+    REQUEST_DEADLINE_SECONDS - wall-clock limit per request (0 = none)
+"""
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import contextmanager
+
+DEFAULT_MAX_ITERATIONS = 10
+DEFAULT_MAX_TOOL_CALLS = 25
+DEFAULT_REQUEST_DEADLINE_SECONDS = 120
+
+_deadline = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The request ran past its deadline."""
+
+
+def max_iterations():
+    return int(os.getenv("AGENT_MAX_ITERATIONS", DEFAULT_MAX_ITERATIONS))
+
+
+def max_tool_calls():
+    return int(os.getenv("AGENT_MAX_TOOL_CALLS", DEFAULT_MAX_TOOL_CALLS))
+
+
+@contextmanager
+def request_deadline(seconds=None):
+    """Give the code inside (and every task it starts) `seconds` to finish."""
+    if seconds is None:
+        seconds = float(os.getenv("REQUEST_DEADLINE_SECONDS", DEFAULT_REQUEST_DEADLINE_SECONDS))
+    token = _deadline.set(time.monotonic() + seconds if seconds > 0 else None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining():
+    """Seconds left before the current request's deadline, or None if it has none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired():
+    left = remaining()
+    return left is not None and left <= 0
+
+
+async def with_deadline(awaitable):
+    """Await `awaitable`, giving up with DeadlineExceeded when the request's deadline passes."""
+    left = remaining()
+    if left is None:
+        return await awaitable
+    if left <= 0:
+        # Don't leave the coroutine un-awaited
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded("request deadline exceeded")
+    try:
+        return await asyncio.wait_for(awaitable, left)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded("request deadline exceeded") from None
@@ -0,0 +1,229 @@
+"""
+Bulk playlist building for playlists of hundreds of tracks.
+
+The agent's usual path has the model copy track URIs out of search results
+into a single addTracksToPlaylist call, which only works for small playlists.
+The buildLargePlaylist tool does the whole job in one tool call instead:
+
+- paginated track searches for each query, a page per query per round with
+  the round's pages fetched concurrently and interleaved, so the genres,
+  artists or moods asked for are mixed evenly through the playlist
+- duplicates dropped with sets, by URI and by name + artist
+- tracks added in chunks of 100 (Spotify's limit per call) by a separate
+  task, so adds overlap with the searches still running; chunks are added
+  one after another, which keeps the playlist in search order
+
+Only a short summary goes back to the model. The URIs travel in the tool
+message's artifact, where summarize_response picks them up, and never pass
+through the LLM context.
+
+Searches go through the searchSpotify tool when it accepts an offset, and
+straight to the Web API with the app token otherwise.
+
+Settings:
+    BULK_PLAYLIST_MAX_TRACKS  - largest playlist the tool builds
+    BULK_SEARCH_CONCURRENCY   - search pages fetched at the same time
+"""
+import asyncio
+import os
+import re
+from itertools import zip_longest
+from typing import List
+
+import httpx
+from langchain_core.tools import StructuredTool
+
+from rate_limits import limiter
+from spotify_auth import client_credentials
+from spotify_results import is_error_result, message_text, parse_created_playlist, parse_search_tracks
+from tool_args import tool_input_schema
+from tool_wrappers import call_inner
+
+BULK_PLAYLIST_TOOL = "buildLargePlaylist"
+DEFAULT_BULK_PLAYLIST_MAX_TRACKS = 1000
+DEFAULT_BULK_SEARCH_CONCURRENCY = 4
+# Spotify's limits: tracks per add call, results per search page, and how deep a search can page
+ADD_CHUNK_SIZE = 100
+SEARCH_PAGE_SIZE = 50
+SEARCH_MAX_OFFSET = 1000
+SPOTIFY_SEARCH_URL = "https://api.spotify.com/v1/search"
+REQUEST_TIMEOUT_SECONDS = 10
+
+
+class BulkPlaylistError(Exception):
+    """A Spotify call the bulk build depends on failed."""
+
+
+async def _call(tool, args):
+    result = await call_inner(tool, args)
+    if is_error_result(result):
+        detail = result.get("error") if isinstance(result, dict) else message_text(result)
+        raise BulkPlaylistError(f"{tool.name} failed: {detail}")
+    return result
+
+
+def _tool_search(search_tool):
+    async def search(query, offset, limit):
+        result = await _call(search_tool, {"query": query, "type": "track", "limit": limit, "offset": offset})
+        return parse_search_tracks(result)
+
+    return search
+
+
+def _web_api_search(client):
+    async def search(query, offset, limit):
+        for attempt in range(2):
+            token = await client_credentials.aget(client)
+            response = await limiter("spotify").run(
+                client.get, SPOTIFY_SEARCH_URL,
+                params={"q": query, "type": "track", "limit": limit, "offset": offset},
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            if response.status_code == 401 and attempt == 0:
+                # The cached app token went stale early; get a fresh one and try once more
+                client_credentials.invalidate()
+                continue
+            if response.status_code != 200:
+                raise BulkPlaylistError(f"Spotify search failed (status {response.status_code})")
+            items = (response.json().get("tracks") or {}).get("items") or []
+            return [
+                {"uri": item["uri"], "name": item.get("name", ""),
+                 "artist": ", ".join(artist.get("name", "") for artist in item.get("artists") or [])}
+                for item in items if item and item.get("uri")
+            ]
+
+    return search
+
+
+def _track_key(track):
+    # The same song often appears on an album, a single and a compilation under different URIs
+    if not track.get("name"):
+        return None
+    return re.sub(r"\W+", " ", f"{track['name']}|{track.get('artist', '')}".lower()).strip()
+
+
+async def _add_chunks(add_tool, playlist_id, chunks, added):
+    """Add queued chunks in order until a None arrives."""
+    while (chunk := await chunks.get()) is not None:
+        await _call(add_tool, {"playlistId": playlist_id, "trackUris": chunk})
+        added.extend(chunk)
+
+
+async def build_large_playlist(tools_by_name, name, description, queries, size, public=False, search=None,
+                               concurrency=DEFAULT_BULK_SEARCH_CONCURRENCY):
+    """
+    Create a playlist and fill it with up to size tracks found by the queries.
+    Returns {"id", "url", "track_uris", "error"}; error is set if the build stopped
+    part way, in which case track_uris holds what was added before that.
+    """
+    queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+    if not queries:
+        raise BulkPlaylistError("at least one search query is needed")
+
+    created = await _call(tools_by_name["createPlaylist"], {"name": name, "description": description, "public": public})
+    playlist = parse_created_playlist(created)
+    if playlist is None:
+        raise BulkPlaylistError("createPlaylist did not return a playlist id")
+
+    chunks = asyncio.Queue()
+    added = []
+    adder = asyncio.create_task(_add_chunks(tools_by_name["addTracksToPlaylist"], playlist["id"], chunks, added))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(query, offset):
+        async with semaphore:
+            return await search(query, offset, SEARCH_PAGE_SIZE)
+
+    seen_uris, seen_keys = set(), set()
+    pending, collected = [], 0
+    offsets = dict.fromkeys(queries, 0)
+    error = None
+    try:
+        while offsets and collected < size and not adder.done():
+            # Always full pages: shrinking them to what is still missing turns overlapping
+            # queries into many tiny searches at the end; the surplus is simply not taken
+            round_queries = list(offsets)
+            pages = await asyncio.gather(*(fetch(q, offsets[q]) for q in round_queries))
+            for query, tracks in zip(round_queries, pages):
+                offsets[query] += SEARCH_PAGE_SIZE
+                if len(tracks) < SEARCH_PAGE_SIZE or offsets[query] >= SEARCH_MAX_OFFSET:
+                    del offsets[query]
+            # Interleave the pages track by track, so the queries are mixed through the playlist
+            for track in (t for rank in zip_longest(*pages) for t in rank if t is not None):
+                if collected >= size:
+                    break
+                key = _track_key(track)
+                if track["uri"] in seen_uris or (key and key in seen_keys):
+                    continue
+                seen_uris.add(track["uri"])
+                if key:
+                    seen_keys.add(key)
+                pending.append(track["uri"])
+                collected += 1
+                if len(pending) == ADD_CHUNK_SIZE:
+                    chunks.put_nowait(pending)
+                    pending = []
+    except (BulkPlaylistError, httpx.HTTPError) as e:
+        error = str(e)
+    finally:
+        # Tracks already found are still added when a later search fails
+        if pending:
+            chunks.put_nowait(pending)
+        chunks.put_nowait(None)
+        try:
+            await adder
+        except BulkPlaylistError as e:
+            error = error or str(e)
+    return {**playlist, "track_uris": added, "error": error}
+
+
+def _search_source(tools_by_name, client):
+    search_tool = tools_by_name.get("searchSpotify")
+    if search_tool is not None and "offset" in (tool_input_schema(search_tool).get("properties") or {}):
+        return _tool_search(search_tool)
+    return _web_api_search(client)
+
+
+def create_bulk_playlist_tool(tools, max_tracks=None, concurrency=None):
+    """The buildLargePlaylist tool, or None if createPlaylist / addTracksToPlaylist aren't available."""
+    tools_by_name = {tool.name: tool for tool in tools}
+    if not {"createPlaylist", "addTracksToPlaylist"}.issubset(tools_by_name):
+        return None
+    if max_tracks is None:
+        max_tracks = int(os.getenv("BULK_PLAYLIST_MAX_TRACKS", DEFAULT_BULK_PLAYLIST_MAX_TRACKS))
+    if concurrency is None:
+        concurrency = int(os.getenv("BULK_SEARCH_CONCURRENCY", DEFAULT_BULK_SEARCH_CONCURRENCY))
+
+    async def buildLargePlaylist(name: str, queries: List[str], size: int = 100, description: str = "",
+                                 public: bool = False):
+        requested, size = size, max(1, min(size, max_tracks))
+        try:
+            async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT_SECONDS) as client:
+                result = await build_large_playlist(
+                    tools_by_name, name, description, queries, size, public=public,
+                    search=_search_source(tools_by_name, client), concurrency=concurrency,
+                )
+        except BulkPlaylistError as e:
+            return f"Error: could not build the playlist: {e}", None
+
+        count = len(result["track_uris"])
+        print(f"📚 Built playlist '{name}' with {count} of {size} tracks")
+        text = f'Created playlist "{name}" with {count} tracks.\nPlaylist ID: {result["id"]}\nURL: {result["url"]}'
+        if result["error"]:
+            text += f"\nStopped early: {result['error']}"
+        elif count < size:
+            text += f"\nThe searches only turned up {count} distinct tracks; try broader or more queries for more."
+        if requested > max_tracks:
+            text += f"\n{max_tracks} tracks is the most one build adds to a playlist."
+        return text, {"id": result["id"], "url": result["url"], "track_uris": result["track_uris"]}
+
+    return StructuredTool.from_function(
+        coroutine=buildLargePlaylist,
+        name=BULK_PLAYLIST_TOOL,
+        description=(
+            f"Create a playlist of up to {max_tracks} tracks in one step. Give it a name, the number of tracks "
+            "and a few search queries (genres, artists, moods); it searches, removes duplicates and adds the "
+            "tracks itself, and returns the playlist URL."
+        ),
+        response_format="content_and_artifact",
+    )
@@ -0,0 +1,195 @@
+"""
+History compaction before each LLM call.
+
+Long sessions would otherwise resend every earlier search result to Groq on
+every hop of the tool loop. A compactor is a list of stages, each taking the
+message list and returning a shorter one. Only turns before the current user
+message are touched: the current turn's tool results are still needed to
+finish the playlist.
+
+Stages (HISTORY_COMPACTION, comma separated, applied in order):
+    truncate_tools - cut old ToolMessage payloads to TOOL_RESULT_MAX_CHARS
+    summary        - fold old turns into a rolling summary once the history
+                     passes SUMMARY_TRIGGER_TOKENS
+    window         - keep the most recent turns that fit HISTORY_TOKEN_BUDGET
+"""
+import os
+from collections import OrderedDict
+
+from langchain_core.messages import HumanMessage, SystemMessage, ToolMessage
+from langchain_core.messages.utils import count_tokens_approximately, trim_messages
+
+from metrics import HISTORY_COMPACTION_TOKENS, log_event
+from rate_limits import limiter
+
+DEFAULT_STAGES = "truncate_tools,window"
+DEFAULT_TOOL_RESULT_MAX_CHARS = 300
+DEFAULT_HISTORY_TOKEN_BUDGET = 8000
+DEFAULT_SUMMARY_TRIGGER_TOKENS = 4000
+DEFAULT_SUMMARY_KEEP_TURNS = 2
+
+
+def split_current_turn(messages):
+    """Split messages into (history, current turn); the current turn starts at the last user message."""
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage):
+            return messages[:i], messages[i:]
+    return [], messages
+
+
+def _turn_starts(messages):
+    return [i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)]
+
+
+class TruncateToolResults:
+    """Shorten tool payloads from earlier turns; max_chars=0 drops them to a placeholder."""
+
+    def __init__(self, max_chars=DEFAULT_TOOL_RESULT_MAX_CHARS):
+        self.max_chars = max_chars
+
+    async def __call__(self, messages):
+        history, current = split_current_turn(messages)
+        compacted = []
+        for msg in history:
+            content = msg.content if isinstance(msg.content, str) else str(msg.content)
+            if isinstance(msg, ToolMessage) and len(content) > self.max_chars:
+                # The ToolMessage itself must stay so the earlier tool call still has a result
+                shortened = content[:self.max_chars] + " ...[truncated]" if self.max_chars else "[tool output removed]"
+                msg = msg.model_copy(update={"content": shortened})
+            compacted.append(msg)
+        return compacted + current
+
+
+class SlidingWindow:
+    """Keep as many of the most recent whole turns as fit in the token budget."""
+
+    def __init__(self, max_tokens=DEFAULT_HISTORY_TOKEN_BUDGET):
+        self.max_tokens = max_tokens
+
+    async def __call__(self, messages):
+        history, current = split_current_turn(messages)
+        budget = self.max_tokens - count_tokens_approximately(current)
+        if not history or budget <= 0:
+            return current
+
+        # A leading summary message is kept whatever happens
+        pinned = [m for m in history[:1] if isinstance(m, SystemMessage)]
+        history = history[len(pinned):]
+        budget -= count_tokens_approximately(pinned)
+        if budget <= 0:
+            return pinned + current
+
+        trimmed = trim_messages(
+            history,
+            max_tokens=budget,
+            token_counter=count_tokens_approximately,
+            strategy="last",
+            start_on="human",
+            allow_partial=False,
+        )
+        return pinned + trimmed + current
+
+
+class RollingSummary:
+    """
+    Replace old turns with an LLM-written summary once the history gets long.
+
+    The most recent keep_turns turns are left verbatim. Summaries are cached by
+    the id of the last message they cover, so the tool loop doesn't pay for a
+    new summary on every hop.
+    """
+
+    def __init__(self, llm, trigger_tokens=DEFAULT_SUMMARY_TRIGGER_TOKENS,
+                 keep_turns=DEFAULT_SUMMARY_KEEP_TURNS, cache_size=256):
+        self.llm = llm
+        self.trigger_tokens = trigger_tokens
+        self.keep_turns = keep_turns
+        self.cache_size = cache_size
+        self._summaries = OrderedDict()
+
+    async def _summarize(self, old_messages):
+        key = (old_messages[-1].id, len(old_messages))
+        if key[0] and key in self._summaries:
+            self._summaries.move_to_end(key)
+            return self._summaries[key]
+
+        transcript = "\n".join(
+            f"{msg.type}: {msg.content if isinstance(msg.content, str) else msg.content!s}"
+            for msg in old_messages
+        )
+        response = await limiter("groq").run(self.llm.ainvoke, [
+            SystemMessage(content=(
+                "Summarize this conversation between a user and a Spotify playlist assistant in a few sentences. "
+                "Keep the user's music preferences and the names and URLs of any playlists created."
+            )),
+            HumanMessage(content=transcript),
+        ], config={"tags": ["internal"]})  # keeps the summary out of the streamed reply
+        summary = response.content
+
+        if key[0]:
+            self._summaries[key] = summary
+            if len(self._summaries) > self.cache_size:
+                self._summaries.popitem(last=False)
+        return summary
+
+    async def __call__(self, messages):
+        history, current = split_current_turn(messages)
+        if count_tokens_approximately(history) <= self.trigger_tokens:
+            return messages
+
+        starts = _turn_starts(history)
+        if len(starts) <= self.keep_turns:
+            return messages
+        cut = starts[-self.keep_turns] if self.keep_turns else len(history)
+        old, recent = history[:cut], history[cut:]
+
+        summary = await self._summarize(old)
+        return [SystemMessage(content=f"Summary of the earlier conversation: {summary}")] + recent + current
+
+
+class HistoryCompactor:
+    """Runs the stages in order and records prompt token counts before and after (also in /metrics)."""
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        self.calls = 0
+        self.tokens_before = 0
+        self.tokens_after = 0
+
+    async def __call__(self, messages):
+        before = count_tokens_approximately(messages)
+        for stage in self.stages:
+            messages = await stage(messages)
+        after = count_tokens_approximately(messages)
+
+        self.calls += 1
+        self.tokens_before += before
+        self.tokens_after += after
+        HISTORY_COMPACTION_TOKENS.inc(before, stage="before")
+        HISTORY_COMPACTION_TOKENS.inc(after, stage="after")
+        if after < before:
+            log_event("history_compaction", tokens_before=before, tokens_after=after)
+        return messages
+
+
+def build_history_compactor(llm, stages=None):
+    """Build the compactor configured by HISTORY_COMPACTION and its budget variables."""
+    if stages is None:
+        stages = os.getenv("HISTORY_COMPACTION", DEFAULT_STAGES)
+    names = [name.strip() for name in stages.split(",") if name.strip()]
+
+    built = []
+    for name in names:
+        if name == "truncate_tools":
+            built.append(TruncateToolResults(int(os.getenv("TOOL_RESULT_MAX_CHARS", DEFAULT_TOOL_RESULT_MAX_CHARS))))
+        elif name == "window":
+            built.append(SlidingWindow(int(os.getenv("HISTORY_TOKEN_BUDGET", DEFAULT_HISTORY_TOKEN_BUDGET))))
+        elif name == "summary":
+            built.append(RollingSummary(
+                llm,
+                trigger_tokens=int(os.getenv("SUMMARY_TRIGGER_TOKENS", DEFAULT_SUMMARY_TRIGGER_TOKENS)),
+                keep_turns=int(os.getenv("SUMMARY_KEEP_TURNS", DEFAULT_SUMMARY_KEEP_TURNS)),
+            ))
+        else:
+            raise ValueError(f"Unknown HISTORY_COMPACTION stage: {name!r}")
+    return HistoryCompactor(built)
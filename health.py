@@ -0,0 +1,146 @@
+"""
+Credential and upstream health checks for Spotify and Groq.
+
+Both probes run concurrently with a timeout, so a hung endpoint can't stall
+startup. The timeout bounds each probe as a whole, including waits on the
+rate limiter after a 429, so /health answers within it and reports a probe
+that ran out of time as failed. Successful results are cached in memory and on disk for
+HEALTH_CACHE_TTL_SECONDS, keyed by a hash of the credentials, so restarts and
+frequent load-balancer probes don't pay two network round-trips each time.
+Failures are never cached.
+
+Settings:
+    HEALTH_CHECK_TIMEOUT_SECONDS - per-probe timeout, rate-limit waits included
+    HEALTH_CACHE_TTL_SECONDS     - how long a successful check is trusted
+    HEALTH_CACHE_PATH            - on-disk cache file
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+import httpx
+
+from rate_limits import limiter
+from spotify_auth import SpotifyAuthError, client_credentials
+
+GROQ_MODELS_URL = "https://api.groq.com/openai/v1/models"
+DEFAULT_HEALTH_CHECK_TIMEOUT_SECONDS = 5.0
+DEFAULT_HEALTH_CACHE_TTL_SECONDS = 10 * 60
+DEFAULT_HEALTH_CACHE_PATH = os.path.join(".cache", "health.json")
+
+_memory_cache = {}
+
+
+def _result(ok, detail, started):
+    return {"ok": ok, "detail": detail, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+
+async def check_spotify(client):
+    """Spotify credentials are valid if a client-credentials token can be obtained."""
+    started = time.perf_counter()
+    client_id = os.getenv("SPOTIFY_CLIENT_ID")
+    client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+    redirect_uri = os.getenv("SPOTIFY_REDIRECT_URI")
+    if not all([client_id, client_secret, redirect_uri]):
+        return _result(False, "Missing Spotify credentials in .env file", started)
+
+    try:
+        # A still-valid cached app token proves the credentials without another round-trip
+        await client_credentials.aget(client)
+    except SpotifyAuthError as e:
+        return _result(False, str(e), started)
+    except httpx.HTTPError as e:
+        return _result(False, f"Could not reach the Spotify API: {e!r}", started)
+    return _result(True, "Spotify API credentials are valid", started)
+
+
+async def check_groq(client):
+    """The Groq key is valid if it can list the available models."""
+    started = time.perf_counter()
+    api_key = os.getenv("GROQ_API_KEY")
+    if not api_key:
+        return _result(False, "Missing groq api key in .env file", started)
+
+    try:
+        response = await limiter("groq").run(client.get, GROQ_MODELS_URL, headers={"Authorization": f"Bearer {api_key}"})
+    except httpx.HTTPError as e:
+        return _result(False, f"Could not reach the Groq API: {e!r}", started)
+    if response.status_code != 200:
+        return _result(False, f"Groq API key rejected (status {response.status_code})", started)
+    return _result(True, "Groq API key is valid", started)
+
+
+CHECKS = {"spotify": check_spotify, "groq": check_groq}
+
+
+async def _run_check(name, client, timeout):
+    # The client's timeout is per request; Retry-After waits and retries in between aren't covered by it
+    started = time.perf_counter()
+    try:
+        return await asyncio.wait_for(CHECKS[name](client), timeout)
+    except asyncio.TimeoutError:
+        return _result(False, f"{name.capitalize()} check timed out after {timeout:g}s", started)
+
+
+def _credentials_key():
+    # Changing any credential invalidates the cached results
+    names = ["SPOTIFY_CLIENT_ID", "SPOTIFY_CLIENT_SECRET", "SPOTIFY_REDIRECT_URI", "GROQ_API_KEY"]
+    return hashlib.sha256("\0".join(os.getenv(n, "") for n in names).encode()).hexdigest()
+
+
+def _read_disk_cache(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_disk_cache(path, entries):
+    try:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"⚠️ Could not write health check cache: {e}")
+
+
+async def run_health_checks(use_cache=True):
+    """
+    Run the Spotify and Groq checks concurrently and return
+    {"ok": bool, "checks": {"spotify": {...}, "groq": {...}}}.
+    """
+    ttl = float(os.getenv("HEALTH_CACHE_TTL_SECONDS", DEFAULT_HEALTH_CACHE_TTL_SECONDS))
+    timeout = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", DEFAULT_HEALTH_CHECK_TIMEOUT_SECONDS))
+    cache_path = os.getenv("HEALTH_CACHE_PATH", DEFAULT_HEALTH_CACHE_PATH)
+    key = _credentials_key()
+    now = time.time()
+
+    results = {}
+    if use_cache:
+        if not _memory_cache:
+            _memory_cache.update(_read_disk_cache(cache_path))
+        for name in CHECKS:
+            entry = _memory_cache.get(name)
+            if entry and entry.get("key") == key and now - entry.get("checked_at", 0) < ttl:
+                results[name] = {**entry["result"], "cached": True}
+
+    pending = [name for name in CHECKS if name not in results]
+    if pending:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            outcomes = await asyncio.gather(*(_run_check(name, client, timeout) for name in pending))
+        for name, result in zip(pending, outcomes):
+            results[name] = {**result, "cached": False}
+            if result["ok"]:
+                _memory_cache[name] = {"key": key, "checked_at": now, "result": result}
+            else:
+                _memory_cache.pop(name, None)
+        _write_disk_cache(cache_path, _memory_cache)
+
+    return {"ok": all(r["ok"] for r in results.values()), "checks": results}
@@ -0,0 +1,230 @@
+"""
+Pool of warm MCP server connections shared by every request.
+
+Each slot is its own MCPClient, i.e. its own spotify-mcp-server process.
+Slots are started once, when the backend starts, and tool calls borrow a free
+slot for the duration of the call. A background health check pings idle slots
+and restarts any whose server process has died.
+
+The pool can hand out tools before any server is running (built from cached
+schemas, see tool_registry.py); the servers are then started on first use.
+
+Settings:
+    MCP_CONFIG_FILE                    - mcp_use config describing the server
+    MCP_POOL_SIZE                      - number of server processes to keep warm
+    MCP_HEALTH_CHECK_INTERVAL_SECONDS  - how often idle slots are pinged
+"""
+import asyncio
+import copy
+import os
+from contextlib import asynccontextmanager
+from typing import Any
+
+from mcp_use.client import MCPClient
+from mcp_use.adapters.langchain_adapter import LangChainAdapter
+from jsonschema_pydantic import jsonschema_to_pydantic
+
+from budgets import with_deadline
+from rate_limits import limiter
+from tool_wrappers import AsyncTool, call_inner
+
+DEFAULT_MCP_CONFIG_FILE = "mcp_config.json"
+DEFAULT_MCP_POOL_SIZE = 2
+DEFAULT_HEALTH_CHECK_INTERVAL_SECONDS = 30
+PING_TIMEOUT_SECONDS = 5
+
+
+class MCPUnavailableError(RuntimeError):
+    """No MCP server could be started for a tool call."""
+
+
+class _Slot:
+    def __init__(self, index):
+        self.index = index
+        self.client = None
+        self.tools = {}
+        self.schemas = []
+
+
+class MCPSessionPool:
+    def __init__(self, config_file=None, size=None):
+        self.config_file = config_file or os.getenv("MCP_CONFIG_FILE", DEFAULT_MCP_CONFIG_FILE)
+        self.size = size if size is not None else int(os.getenv("MCP_POOL_SIZE", DEFAULT_MCP_POOL_SIZE))
+        self._slots = [_Slot(i) for i in range(self.size)]
+        self._idle = asyncio.Queue()
+        self._background = set()
+        self._start_lock = asyncio.Lock()
+        self.started = False
+        self.restarts = 0
+
+    async def _connect(self, slot):
+        # Set the client first, so the server processes are closed if any step below fails
+        slot.client = client = MCPClient.from_config_file(self.config_file)
+        try:
+            await client.create_all_sessions()
+            tools = await LangChainAdapter().create_tools(client)
+            slot.tools = {tool.name: tool for tool in tools}
+            slot.schemas = [
+                {"name": tool.name, "description": tool.description or "", "input_schema": tool.inputSchema}
+                for session in client.get_all_active_sessions().values()
+                for tool in session.connector.tools
+            ]
+        except BaseException:
+            await self._disconnect(slot)
+            raise
+
+    async def _disconnect(self, slot):
+        if slot.client is not None:
+            try:
+                await slot.client.close_all_sessions()
+            except Exception as e:
+                print(f"⚠️ Error closing MCP slot {slot.index}: {e}")
+        slot.client = None
+        slot.tools = {}
+        slot.schemas = []
+
+    async def _restart(self, slot):
+        print(f"🔄 Restarting MCP server in slot {slot.index}")
+        await self._disconnect(slot)
+        await self._connect(slot)
+        self.restarts += 1
+
+    async def start(self):
+        """Start every server process; they come up in parallel. Safe to call more than once."""
+        async with self._start_lock:
+            if self.started:
+                return
+            # Slots connected by an earlier, partly failed start are kept rather than started again
+            results = await asyncio.gather(
+                *(self._connect(slot) for slot in self._slots if not slot.tools), return_exceptions=True
+            )
+            errors = [result for result in results if isinstance(result, BaseException)]
+            if errors:
+                print(f"❌ {len(errors)} of {self.size} MCP server(s) failed to start")
+                raise errors[0]
+            for slot in self._slots:
+                self._idle.put_nowait(slot)
+            self.started = True
+        print(f"✅ MCP pool ready with {self.size} server(s)")
+
+    async def close(self):
+        for task in self._background:
+            task.cancel()
+        await asyncio.gather(*self._background, return_exceptions=True)
+        await asyncio.gather(*(self._disconnect(slot) for slot in self._slots))
+
+    def _sessions(self, slot):
+        return list(slot.client.get_all_active_sessions().values()) if slot.client else []
+
+    async def _is_healthy(self, slot):
+        sessions = self._sessions(slot)
+        if not sessions:
+            return False
+        try:
+            for session in sessions:
+                if not session.is_connected:
+                    return False
+                await asyncio.wait_for(session.connector.client_session.send_ping(), PING_TIMEOUT_SECONDS)
+            return True
+        except Exception:
+            return False
+
+    async def _restart_and_release(self, slot):
+        try:
+            await self._restart(slot)
+        except Exception as e:
+            print(f"❌ Could not restart MCP slot {slot.index}: {e}")
+        finally:
+            self._idle.put_nowait(slot)
+
+    def _release(self, slot):
+        # A server that died mid-call is replaced in the background before anyone else gets the slot
+        sessions = self._sessions(slot)
+        if sessions and all(session.is_connected for session in sessions):
+            self._idle.put_nowait(slot)
+            return
+        task = asyncio.create_task(self._restart_and_release(slot))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    @asynccontextmanager
+    async def acquire(self):
+        slot = await self._idle.get()
+        try:
+            yield slot
+        finally:
+            self._release(slot)
+
+    async def call_tool(self, name, args):
+        # Starting the pool, waiting for a free slot or the rate limit and the call itself all count
+        # against the request deadline
+        return await with_deadline(limiter("spotify").run(self._call_tool, name, args))
+
+    async def _call_tool(self, name, args):
+        if not self.started:
+            await self.start()
+        async with self.acquire() as slot:
+            if not slot.tools:
+                # The background restart of this slot failed; try once more before giving up on the call
+                try:
+                    await self._restart(slot)
+                except Exception as e:
+                    raise MCPUnavailableError(f"MCP server unavailable: {e}") from e
+            return await call_inner(slot.tools[name], args)
+
+    async def health_check(self):
+        """Ping every idle slot once and restart the ones that don't answer."""
+        for _ in range(self._idle.qsize()):
+            slot = self._idle.get_nowait()
+            try:
+                if not await self._is_healthy(slot):
+                    await self._restart(slot)
+            except Exception as e:
+                print(f"❌ MCP health check failed for slot {slot.index}: {e}")
+            finally:
+                self._idle.put_nowait(slot)
+
+    async def run_health_checks(self, interval=None):
+        """Run health_check forever; start as a background task."""
+        if interval is None:
+            interval = float(os.getenv("MCP_HEALTH_CHECK_INTERVAL_SECONDS", DEFAULT_HEALTH_CHECK_INTERVAL_SECONDS))
+        while True:
+            await asyncio.sleep(interval)
+            await self.health_check()
+
+    def tool_schemas(self):
+        """Name, description and JSON input schema of every tool the servers offer."""
+        return next(slot for slot in self._slots if slot.schemas).schemas
+
+    def tools(self, schemas=None):
+        """
+        LangChain tools that run each call on whichever pooled server is free.
+
+        With schemas (e.g. from the on-disk cache) the tools can be built before
+        the pool is started; the servers then start on the first call.
+        """
+        if schemas is None:
+            schemas = self.tool_schemas()
+        adapter = LangChainAdapter()
+        return [
+            PooledTool(
+                name=schema["name"],
+                description=schema["description"],
+                # Same conversion mcp_use applies to the tools it builds itself
+                args_schema=jsonschema_to_pydantic(adapter.fix_schema(copy.deepcopy(schema["input_schema"]))),
+                mcp_input_schema=schema["input_schema"],
+                pool=self,
+            )
+            for schema in schemas
+        ]
+
+
+class PooledTool(AsyncTool):
+    """MCP tool whose calls are routed through an MCPSessionPool."""
+
+    pool: Any
+    # The server's own JSON schema, kept for argument repair (see tool_args.py)
+    mcp_input_schema: dict = {}
+
+    async def _arun(self, **kwargs):
+        return await self.pool.call_tool(self.name, kwargs)
@@ -0,0 +1,315 @@
+"""
+Request-level metrics and tracing for the agent graph.
+
+A small in-process registry of counters and histograms, rendered in the
+Prometheus text format by backend.py at /metrics. The numbers are collected by
+AgentMetricsHandler, a LangChain callback handler passed in the config of every
+graph run (see agent_script._thread_config), which sees each graph run, node,
+LLM call and tool call:
+
+    agent_runs_total / agent_run_seconds        - whole graph runs
+    agent_node_seconds{node}                    - wall time per node (assistant, tools, planner)
+    agent_loop_iterations                       - assistant turns per run
+    llm_request_seconds{model} / llm_tokens_total{model,type}
+    tool_call_seconds{tool,status}              - per tool, i.e. the MCP round-trip
+    tool_args_repaired_total / tool_args_rejected_total{tool} - see tool_args.py
+    agent_budget_exceeded_total{budget}         - requests cut short (see budgets.py)
+    rate_limit_retries_total{upstream}          - 429s from Spotify/Groq (see rate_limits.py)
+    rate_limit_wait_seconds{upstream,priority}  - time spent queued for an upstream
+    llm_route_calls_total{route,model} / llm_escalations_total{route,reason} - see model_routing.py
+    history_compaction_tokens_total{stage}      - prompt history tokens before/after compaction (see compaction.py)
+
+Settings:
+    METRICS_JSON_LOGS - also print one JSON line per run, node, LLM and tool call, and
+                        per history compaction and argument repair (log_event)
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from spotify_results import is_error_result
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+ITERATION_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 25)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, "") for name in self.labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (plus +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self._series.get(tuple(labels.get(name, "") for name in self.labels))
+        return series[2] if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else _format_value(bound)
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, ('le', le))} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, metric):
+        # Re-registering returns the existing metric so modules can declare theirs at import time
+        return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_text, labels=()):
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+RUNS = REGISTRY.counter("agent_runs_total", "Graph runs by outcome", ["status"])
+RUN_SECONDS = REGISTRY.histogram("agent_run_seconds", "Wall time of a whole graph run")
+NODE_SECONDS = REGISTRY.histogram("agent_node_seconds", "Wall time per graph node", ["node"])
+LOOP_ITERATIONS = REGISTRY.histogram(
+    "agent_loop_iterations", "Assistant turns per graph run", buckets=ITERATION_BUCKETS
+)
+LLM_SECONDS = REGISTRY.histogram("llm_request_seconds", "LLM call latency", ["model"])
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "LLM tokens used", ["model", "type"])
+TOOL_SECONDS = REGISTRY.histogram("tool_call_seconds", "Tool call latency, including the MCP hop", ["tool", "status"])
+TOOL_ARGS_REPAIRED = REGISTRY.counter(
+    "tool_args_repaired_total", "Tool calls whose arguments were repaired to fit the schema", ["tool"]
+)
+TOOL_ARGS_REJECTED = REGISTRY.counter(
+    "tool_args_rejected_total", "Tool calls rejected before reaching the tool", ["tool"]
+)
+BUDGET_HITS = REGISTRY.counter(
+    "agent_budget_exceeded_total", "Requests stopped early by a budget (deadline, iterations, tool_calls)", ["budget"]
+)
+RATE_LIMIT_RETRIES = REGISTRY.counter(
+    "rate_limit_retries_total", "Calls an upstream answered with 429 (rate limited)", ["upstream"]
+)
+MODEL_ROUTE_CALLS = REGISTRY.counter(
+    "llm_route_calls_total", "LLM calls by routing step and the model it was routed to", ["route", "model"]
+)
+MODEL_ESCALATIONS = REGISTRY.counter(
+    "llm_escalations_total", "Small-model turns redone on the large model", ["route", "reason"]
+)
+HISTORY_COMPACTION_TOKENS = REGISTRY.counter(
+    "history_compaction_tokens_total", "Approximate prompt history tokens before and after compaction", ["stage"]
+)
+RATE_LIMIT_WAIT_SECONDS = REGISTRY.histogram(
+    "rate_limit_wait_seconds", "Time a call waited for its upstream's rate limit", ["upstream", "priority"]
+)
+
+
+def _json_logs_enabled():
+    return os.getenv("METRICS_JSON_LOGS", "false").lower() in ("1", "true", "yes")
+
+
+def log_event(event, **fields):
+    """Print one JSON log line for event when METRICS_JSON_LOGS is on."""
+    if _json_logs_enabled():
+        print(json.dumps({"event": event, "ts": time.time(), **fields}, default=str))
+
+
+def _model_name(serialized, metadata):
+    if metadata and metadata.get("ls_model_name"):
+        return metadata["ls_model_name"]
+    kwargs = (serialized or {}).get("kwargs") or {}
+    return kwargs.get("model_name") or kwargs.get("model") or (serialized or {}).get("name") or "unknown"
+
+
+def _token_usage(response):
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+
+
+class AgentMetricsHandler(BaseCallbackHandler):
+    """Callback handler that records graph, node, LLM and tool timings into REGISTRY."""
+
+    # Only cheap bookkeeping here, so run on the event loop instead of a thread pool
+    run_inline = True
+
+    def __init__(self):
+        self._starts = {}
+        # run id -> root graph run id, so node and LLM events can be tied to their request
+        self._roots = {}
+        self._iterations = {}
+
+    def _log(self, event, run_id, **fields):
+        if _json_logs_enabled():
+            log_event(event, run_id=str(self._roots.get(run_id, run_id)), **fields)
+
+    def _start(self, run_id, parent_run_id, kind, **info):
+        self._roots[run_id] = self._roots.get(parent_run_id, parent_run_id) if parent_run_id else run_id
+        self._starts[run_id] = (kind, time.perf_counter(), info)
+
+    def _finish(self, run_id):
+        entry = self._starts.pop(run_id, None)
+        if entry is None:
+            return None, None, {}
+        kind, started, info = entry
+        return kind, time.perf_counter() - started, info
+
+    # Graph runs and nodes
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node")
+        if parent_run_id is None:
+            self._iterations[run_id] = 0
+            self._start(run_id, None, "run", thread_id=(metadata or {}).get("thread_id"))
+        elif node and kwargs.get("name") == node:
+            self._start(run_id, parent_run_id, "node", node=node)
+            if node == "assistant":
+                root = self._roots[run_id]
+                if root in self._iterations:
+                    self._iterations[root] += 1
+        else:
+            # Keep the parent chain so nested LLM and tool calls resolve to their root run
+            self._roots[run_id] = self._roots.get(parent_run_id, parent_run_id)
+
+    def _end_chain(self, run_id, status):
+        kind, seconds, info = self._finish(run_id)
+        if kind == "run":
+            iterations = self._iterations.pop(run_id, 0)
+            RUNS.inc(status=status)
+            RUN_SECONDS.observe(seconds)
+            LOOP_ITERATIONS.observe(iterations)
+            self._log("run", run_id, status=status, seconds=round(seconds, 4), iterations=iterations, **info)
+            self._roots = {k: v for k, v in self._roots.items() if v != run_id}
+            return
+        if kind == "node":
+            NODE_SECONDS.observe(seconds, node=info["node"])
+            self._log("node", run_id, node=info["node"], status=status, seconds=round(seconds, 4))
+        # Nodes and nested chains stay mapped until their root run ends
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end_chain(run_id, "ok")
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end_chain(run_id, "error")
+
+    # LLM calls
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start(run_id, parent_run_id, "llm", model=_model_name(serialized, metadata))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, metadata=None, **kwargs):
+        self._start(run_id, parent_run_id, "llm", model=_model_name(serialized, metadata))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        kind, seconds, info = self._finish(run_id)
+        if kind != "llm":
+            return
+        input_tokens, output_tokens = _token_usage(response)
+        LLM_SECONDS.observe(seconds, model=info["model"])
+        LLM_TOKENS.inc(input_tokens, model=info["model"], type="input")
+        LLM_TOKENS.inc(output_tokens, model=info["model"], type="output")
+        self._log("llm", run_id, model=info["model"], seconds=round(seconds, 4),
+                  input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        kind, seconds, info = self._finish(run_id)
+        if kind == "llm":
+            LLM_SECONDS.observe(seconds, model=info["model"])
+            self._log("llm", run_id, model=info["model"], seconds=round(seconds, 4), error=repr(error))
+
+    # Tool calls
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs):
+        name = kwargs.get("name") or (serialized or {}).get("name") or "unknown"
+        self._start(run_id, parent_run_id, "tool", tool=name)
+
+    def _end_tool(self, run_id, status):
+        kind, seconds, info = self._finish(run_id)
+        if kind == "tool":
+            TOOL_SECONDS.observe(seconds, tool=info["tool"], status=status)
+            self._log("tool", run_id, tool=info["tool"], status=status, seconds=round(seconds, 4))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        # MCP tools report failures as an error status on the result instead of raising
+        failed = getattr(output, "status", None) == "error" or is_error_result(getattr(output, "content", output))
+        self._end_tool(run_id, "error" if failed else "ok")
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._end_tool(run_id, "error")
+
+
+metrics_handler = AgentMetricsHandler()
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    return REGISTRY.render()
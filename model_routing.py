@@ -0,0 +1,143 @@
+"""
+Per-step model routing: a small, fast model for the simple hops and the large
+one only where it matters.
+
+Every LLM call in a run belongs to a route:
+
+    plan        - the assistant's first turn on a new user message: deciding what to search for
+    tool_args   - later assistant turns that fill in the next tool call from the results so far
+    summary     - the turn after tracks were added: usually just the reply, but it keeps every
+                  tool, since more adds or a second playlist may still be left
+    planner     - the structured plan of planner mode (see planner.py)
+    compaction  - rolling history summaries (see compaction.py)
+
+Each route maps to a model tier, "large" or "small", and every assistant route
+is bound to the full tool set. When a small-model turn comes back with a tool
+call that fails schema validation (or the call itself fails), the turn is
+redone once on the large model. Latency and tokens are recorded per model by metrics.py
+(llm_request_seconds / llm_tokens_total{model}); routing decisions and
+escalations are counted in llm_route_calls_total{route,model} and
+llm_escalations_total{route,reason}.
+
+Settings:
+    AGENT_MODEL        - the large model
+    AGENT_SMALL_MODEL  - the small model; unset (the default) runs every route on AGENT_MODEL
+    MODEL_ROUTES       - comma separated route=tier overrides, e.g. "plan=small,summary=small"
+"""
+import os
+
+from langchain_core.messages import ToolMessage
+from langchain_groq import ChatGroq
+
+from bulk_playlist import BULK_PLAYLIST_TOOL
+from metrics import MODEL_ESCALATIONS, MODEL_ROUTE_CALLS
+from spotify_results import is_error_result
+
+DEFAULT_AGENT_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+LARGE, SMALL = "large", "small"
+DEFAULT_ROUTES = {
+    "plan": LARGE,
+    "tool_args": SMALL,
+    "summary": SMALL,
+    "planner": LARGE,
+    "compaction": SMALL,
+}
+ASSISTANT_ROUTES = ("plan", "tool_args", "summary")
+# A successful result from one of these usually means only the reply is left
+PLAYLIST_DONE_TOOLS = {"addTracksToPlaylist", BULK_PLAYLIST_TOOL}
+
+
+def _groq(model):
+    # 429s, timeouts and 5xx answers are retried by rate_limits.py, which also paces the other requests
+    return ChatGroq(model=model, max_retries=0)
+
+
+def model_name(llm):
+    return getattr(llm, "model_name", None) or getattr(llm, "model", None) or type(llm).__name__
+
+
+def parse_routes(value):
+    """Parse MODEL_ROUTES ("route=tier,...") into a dict."""
+    routes = {}
+    for item in value.split(","):
+        if not item.strip():
+            continue
+        route, _, tier = item.partition("=")
+        route, tier = route.strip(), tier.strip()
+        if route not in DEFAULT_ROUTES or tier not in (LARGE, SMALL):
+            raise ValueError(f"Bad MODEL_ROUTES entry {item!r}; expected <route>=large|small "
+                             f"with a route from {', '.join(DEFAULT_ROUTES)}")
+        routes[route] = tier
+    return routes
+
+
+def classify_step(messages):
+    """The assistant route for the next turn, judged from the messages so far."""
+    results = []
+    for msg in reversed(messages):
+        if not isinstance(msg, ToolMessage):
+            break
+        results.append(msg)
+    if not results:
+        return "plan"
+    failed = any(msg.status == "error" or is_error_result(msg.content) for msg in results)
+    if not failed and any(msg.name in PLAYLIST_DONE_TOOLS for msg in results):
+        return "summary"
+    return "tool_args"
+
+
+class ModelRouter:
+    def __init__(self, large, small=None, routes=None):
+        self.models = {LARGE: large}
+        if small is not None:
+            self.models[SMALL] = small
+        self.routes = {**DEFAULT_ROUTES, **(routes or {})}
+        self._bound = {}
+
+    def tier(self, route):
+        tier = self.routes.get(route, LARGE)
+        return tier if tier in self.models else LARGE
+
+    def llm(self, route):
+        return self.models[self.tier(route)]
+
+    def bind_tools(self, tools, **kwargs):
+        """Bind the tools to each assistant route's model, plus the large model for escalations."""
+        for route in ASSISTANT_ROUTES + ("escalation",):
+            llm = self.models[LARGE] if route == "escalation" else self.llm(route)
+            self._bound[route] = llm.bind_tools(tools, **kwargs) if tools else llm
+
+    def bound(self, route):
+        MODEL_ROUTE_CALLS.inc(route=route, model=model_name(self.llm(route)))
+        return self._bound[route]
+
+    def needs_escalation(self, route, response, arg_coercer):
+        """Why a small-model turn should be redone on the large model, or None."""
+        if self.tier(route) != SMALL:
+            return None
+        for call in response.tool_calls:
+            if arg_coercer.check_call(call):
+                return "invalid_tool_call"
+        if getattr(response, "invalid_tool_calls", None):
+            return "invalid_tool_call"
+        return None
+
+    def escalate(self, route, reason):
+        """Record that a route's turn is being redone on the "escalation" binding."""
+        MODEL_ESCALATIONS.inc(route=route, reason=reason)
+        print(f"⬆️ Escalating the {route} turn to {model_name(self.models[LARGE])} ({reason})")
+
+
+def create_model_router(llm=None, small_llm=None, routes=None):
+    """
+    Build the router from the AGENT_MODEL / AGENT_SMALL_MODEL / MODEL_ROUTES settings.
+    A passed-in llm is used as the large model; the small model then only comes
+    from small_llm, so tests and benchmarks with one fake model stay on it.
+    """
+    if small_llm is None and llm is None and os.getenv("AGENT_SMALL_MODEL"):
+        small_llm = _groq(os.getenv("AGENT_SMALL_MODEL"))
+    if llm is None:
+        llm = _groq(os.getenv("AGENT_MODEL", DEFAULT_AGENT_MODEL))
+    if routes is None:
+        routes = parse_routes(os.getenv("MODEL_ROUTES", ""))
+    return ModelRouter(llm, small_llm, routes)
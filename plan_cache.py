@@ -0,0 +1,220 @@
+"""
+Cache of playlist plans for near-identical prompts.
+
+Requests like "chill lo-fi playlist for studying" repeat across users, and
+each one normally costs several Groq calls and Spotify searches. This cache
+keeps only the read-only half of such a turn: the playlist name, description
+and chosen tracks. On a hit the graph skips the LLM and the searches and goes
+straight to createPlaylist + addTracksToPlaylist, so every user still gets a
+playlist of their own.
+
+The key is the prompt normalized without an embedding model: lowercased,
+punctuation and hyphens removed ("lo-fi" == "lofi"), filler words dropped and
+plural and -ing endings stripped. Word order is kept ("Drake then Kanye" is
+not "Kanye then Drake"), and so are numbers, so "20 songs" and "10 songs" stay
+different plans. Prompts with a negation or exclusion ("no rap", "not Drake",
+"without vocals") aren't cached at all, since one misplaced word flips them.
+
+Settings:
+    PLAN_CACHE_TTL_SECONDS  - how long a plan is reused
+    PLAN_CACHE_MAX_ENTRIES  - LRU size bound; 0 (the default) disables the cache
+"""
+import os
+import re
+import time
+from collections import OrderedDict
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.graph import END
+
+from planner import PlanExecutionError, create_playlist_with_tracks
+from spotify_results import is_error_result, message_text, parse_search_tracks
+
+DEFAULT_PLAN_CACHE_TTL_SECONDS = 60 * 60
+DEFAULT_PLAN_CACHE_MAX_ENTRIES = 0
+# Misses waiting for their turn to finish; bounded in case a run dies before it does
+MAX_PENDING_MISSES = 1024
+
+FILLER_WORDS = {
+    "a", "an", "the", "me", "my", "us", "our", "i", "you", "please", "can", "could", "would", "want", "need",
+    "make", "create", "build", "give", "generate", "put", "together", "new", "some", "for", "of", "to", "with",
+    "and", "that", "is", "are", "just", "playlist", "songs", "song", "tracks", "track", "music",
+}
+
+
+# Words that exclude something; a prompt with one of these is never cached
+NEGATION_WORDS = {
+    "no", "not", "non", "without", "except", "excluding", "exclude", "minus", "avoid", "never", "nothing",
+    "none", "instead", "dont", "don", "doesnt", "doesn", "isnt", "isn", "arent", "aren", "nor",
+}
+
+
+def _stem(word):
+    if len(word) > 5 and word.endswith("ing"):
+        return word[:-3]
+    if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+
+def normalize_prompt(text):
+    """Cache key for a prompt, or None if it must not be cached or nothing meaningful is left."""
+    text = text.lower()
+    if NEGATION_WORDS.intersection(re.findall(r"[a-z0-9]+", text)):
+        return None
+    text = re.sub(r"(?<=\w)-(?=\w)", "", text)
+    words = [_stem(word) for word in re.findall(r"[a-z0-9]+", text) if word not in FILLER_WORDS]
+    return " ".join(words) or None
+
+
+class PlanCache:
+    def __init__(self, ttl_seconds=DEFAULT_PLAN_CACHE_TTL_SECONDS, max_entries=DEFAULT_PLAN_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.seconds_saved = 0.0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] < time.monotonic():
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1], entry[2]
+
+    def put(self, key, plan, cost):
+        """Store a plan along with how long the full turn that produced it took."""
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, plan, cost)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "seconds_saved": round(self.seconds_saved, 3),
+        }
+
+
+def create_plan_cache():
+    """Build the plan cache from the PLAN_CACHE_* settings."""
+    return PlanCache(
+        ttl_seconds=float(os.getenv("PLAN_CACHE_TTL_SECONDS", DEFAULT_PLAN_CACHE_TTL_SECONDS)),
+        max_entries=int(os.getenv("PLAN_CACHE_MAX_ENTRIES", DEFAULT_PLAN_CACHE_MAX_ENTRIES)),
+    )
+
+
+def extract_plan(turn_messages):
+    """
+    The reusable part of a turn that created a playlist: its name, description and
+    the tracks that were added, with names from the turn's search results.
+    """
+    calls_by_id = {}
+    known_tracks = {}
+    plan = None
+    uris = []
+    for msg in turn_messages:
+        if isinstance(msg, AIMessage):
+            for call in msg.tool_calls:
+                calls_by_id[call.get("id")] = call
+        elif isinstance(msg, ToolMessage) and msg.status != "error" and not is_error_result(msg.content):
+            args = calls_by_id.get(msg.tool_call_id, {}).get("args", {})
+            if msg.name == "searchSpotify":
+                known_tracks.update((track["uri"], track) for track in parse_search_tracks(msg.content))
+            elif msg.name == "createPlaylist":
+                plan = {"name": args.get("name") or "My Playlist", "description": args.get("description", "")}
+            elif msg.name == "addTracksToPlaylist":
+                uris.extend(args.get("trackUris") or [])
+
+    if plan is None or not uris:
+        return None
+    plan["tracks"] = [known_tracks.get(uri, {"uri": uri, "name": "", "artist": ""}) for uri in uris]
+    return plan
+
+
+def create_plan_cache_nodes(plan_cache, tools):
+    """
+    Build the two graph nodes around a turn: plan_cache_lookup runs first and
+    answers from the cache on a hit; remember_plan runs last and stores the plan
+    of a turn that missed.
+    """
+    tools_by_name = {tool.name: tool for tool in tools}
+    required = {"createPlaylist", "addTracksToPlaylist"}
+    # Human message id -> (cache key, when the turn started)
+    pending = OrderedDict()
+
+    async def plan_cache_lookup(state):
+        last = state["messages"][-1]
+        if not isinstance(last, HumanMessage) or not required.issubset(tools_by_name):
+            return {"messages": []}
+        key = normalize_prompt(message_text(last.content))
+        if key is None:
+            return {"messages": []}
+
+        cached = plan_cache.get(key)
+        if cached is None:
+            pending[last.id] = (key, time.perf_counter())
+            while len(pending) > MAX_PENDING_MISSES:
+                pending.popitem(last=False)
+            return {"messages": []}
+
+        plan, cost = cached
+        started = time.perf_counter()
+        try:
+            messages = await create_playlist_with_tracks(tools_by_name, plan["name"], plan["description"],
+                                                         plan["tracks"])
+        except PlanExecutionError as e:
+            print(f"⚠️ Cached plan failed ({e}), falling back to the agent loop")
+            return {"messages": e.messages}
+        plan_cache.seconds_saved += max(0.0, cost - (time.perf_counter() - started))
+        print(f"⚡ Plan cache hit for '{key}'")
+        return {"messages": messages}
+
+    async def remember_plan(state):
+        messages = state["messages"]
+        turn_start = max((i for i, msg in enumerate(messages) if isinstance(msg, HumanMessage)), default=None)
+        if turn_start is None:
+            return {"messages": []}
+        miss = pending.pop(messages[turn_start].id, None)
+        if miss is None:
+            return {"messages": []}
+
+        key, started = miss
+        # A follow-up ("make it longer") depends on the earlier turns, so only self-contained first prompts are cached
+        if any(isinstance(msg, HumanMessage) for msg in messages[:turn_start]):
+            return {"messages": []}
+        plan = extract_plan(messages[turn_start:])
+        if plan is not None:
+            plan_cache.put(key, plan, time.perf_counter() - started)
+        return {"messages": []}
+
+    return plan_cache_lookup, remember_plan
+
+
+def route_after_plan_cache(next_node):
+    """End the run on a cache hit, otherwise continue with next_node."""
+
+    def route(state):
+        last = state["messages"][-1]
+        if isinstance(last, AIMessage) and not last.tool_calls:
+            return END
+        return next_node
+
+    return route
@@ -0,0 +1,239 @@
+"""
+Planner mode: build a playlist from one structured LLM call.
+
+The ReAct loop spends at least four LLM round-trips per playlist (search,
+create, add, summarize) even though the workflow is fixed. In planner mode the
+model is asked once for a PlaylistPlan; the searches, createPlaylist and
+addTracksToPlaylist then run directly over the MCP tools and the reply is
+written from a template. Plans for more than MAX_PLAN_SIZE songs are handed
+to buildLargePlaylist (see bulk_playlist.py) in a single call instead. If the
+request isn't a playlist request, or any step fails, the graph falls back to
+the normal assistant loop with whatever progress was made.
+"""
+import asyncio
+import uuid
+from typing import List
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.graph import END
+from pydantic import BaseModel, Field
+
+from budgets import with_deadline
+from bulk_playlist import BULK_PLAYLIST_TOOL
+from rate_limits import limiter
+from spotify_results import is_error_result, parse_created_playlist, parse_search_tracks
+from tool_args import tool_input_schema
+
+# One addTracksToPlaylist call takes at most 100 URIs
+MAX_PLAN_SIZE = 100
+MAX_SEARCH_LIMIT = 50
+
+PLANNER_PROMPT = """You plan Spotify playlists. Look at the user's latest message.
+If it asks for a new playlist, fill in the plan:
+- queries: 1 to 5 short Spotify search queries that together cover the request (genres, moods, artists, eras);
+  for a long playlist, use more queries rather than fewer
+- playlist_name and a one-sentence description
+- size: the number of songs the user asked for, or 10 if they did not say
+Otherwise set is_playlist_request to false and leave the rest empty."""
+
+
+class PlaylistPlan(BaseModel):
+    """Plan for creating a Spotify playlist in one go."""
+
+    is_playlist_request: bool = Field(description="True only if the latest user message asks for a new playlist")
+    queries: List[str] = Field(default_factory=list, description="Spotify search queries for the songs")
+    playlist_name: str = Field(default="", description="Name of the playlist")
+    description: str = Field(default="", description="Short playlist description")
+    size: int = Field(default=10, description="Number of songs in the playlist")
+
+
+class PlanExecutionError(Exception):
+    """A plan step failed; messages holds the tool calls and results made so far."""
+
+    def __init__(self, reason, messages):
+        super().__init__(reason)
+        self.messages = messages
+
+
+def _tool_call(name, args):
+    return {"name": name, "args": args, "id": f"plan_{uuid.uuid4().hex[:12]}", "type": "tool_call"}
+
+
+async def _invoke(tool, call):
+    try:
+        return await tool.ainvoke(call)
+    except Exception as e:
+        # Every tool call needs a result message, or the fallback LLM call is rejected
+        return ToolMessage(content=f"Error: {e!r}", name=call["name"], tool_call_id=call["id"], status="error")
+
+
+async def _run_step(tools_by_name, calls, messages):
+    """Record the calls as an AI message, run them concurrently and record their results."""
+    messages.append(AIMessage(content="", tool_calls=calls))
+    results = await asyncio.gather(*(_invoke(tools_by_name[call["name"]], call) for call in calls))
+    messages.extend(results)
+
+    for result in results:
+        if result.status == "error" or is_error_result(result.content):
+            raise PlanExecutionError(f"{result.name} failed: {result.content}", messages)
+    return results
+
+
+def _pick_tracks(result_lists, size):
+    """Round-robin across the searches so every query is represented, skipping duplicates."""
+    picked, seen = [], set()
+    for rank in range(max((len(r) for r in result_lists), default=0)):
+        for results in result_lists:
+            if rank < len(results) and results[rank]["uri"] not in seen:
+                seen.add(results[rank]["uri"])
+                picked.append(results[rank])
+                if len(picked) == size:
+                    return picked
+    return picked
+
+
+def format_reply(playlist_name, playlist, tracks):
+    lines = [f"I've created **{playlist_name}** with {len(tracks)} songs:", ""]
+    for i, track in enumerate(tracks, 1):
+        if track["name"]:
+            lines.append(f"{i}. {track['name']} - {track['artist']}")
+        else:
+            lines.append(f"{i}. {track['uri']}")
+    lines += ["", f"Listen here: {playlist['url']}"]
+    return "\n".join(lines)
+
+
+async def run_large_playlist_plan(plan, tools_by_name):
+    """Execute a plan too big for one addTracksToPlaylist call with buildLargePlaylist."""
+    messages = []
+    name = plan.playlist_name or "My Playlist"
+    built = await _run_step(
+        tools_by_name,
+        [_tool_call(BULK_PLAYLIST_TOOL, {"name": name, "queries": plan.queries[:5], "size": plan.size,
+                                         "description": plan.description})],
+        messages,
+    )
+    result = built[0]
+    if not result.artifact:
+        raise PlanExecutionError(f"{BULK_PLAYLIST_TOOL} failed: {result.content}", messages)
+
+    count = len(result.artifact["track_uris"])
+    lines = [f"I've created **{name}** with {count} songs."]
+    if count < plan.size:
+        # The tool's own note says why: its size cap, a failed call or too few distinct search results
+        notes = [line for line in result.content.splitlines()[3:] if line]
+        lines.append(f"That's fewer than the {plan.size} you asked for. " + " ".join(notes))
+    lines += ["", f"Listen here: {result.artifact['url']}"]
+    messages.append(AIMessage(content="\n".join(line.rstrip() for line in lines)))
+    return messages
+
+
+async def run_playlist_plan(plan, tools_by_name):
+    """Execute a plan over the MCP tools and return the messages to add to the state."""
+    if plan.size > MAX_PLAN_SIZE:
+        if BULK_PLAYLIST_TOOL in tools_by_name:
+            return await run_large_playlist_plan(plan, tools_by_name)
+        # Never quietly cut the playlist short; the assistant loop can add tracks in several calls
+        raise PlanExecutionError(f"a {plan.size}-song plan needs {BULK_PLAYLIST_TOOL}", [])
+
+    messages = []
+    size = max(1, plan.size)
+    queries = plan.queries[:5]
+    # Ask for a few extra per query to make up for duplicates across searches
+    per_query = -(-size // len(queries)) + 2
+    # A search returns at most MAX_SEARCH_LIMIT tracks, so larger plans page through the results
+    # when the tool takes an offset; without one the playlist is as long as the first pages allow
+    if "offset" in (tool_input_schema(tools_by_name["searchSpotify"]).get("properties") or {}):
+        offsets = range(0, per_query, MAX_SEARCH_LIMIT)
+    else:
+        offsets = [0]
+    calls = [
+        _tool_call("searchSpotify", {"query": q, "type": "track", "limit": min(MAX_SEARCH_LIMIT, per_query - offset),
+                                     **({"offset": offset} if offset else {})})
+        for q in queries for offset in offsets
+    ]
+
+    searches = await _run_step(tools_by_name, calls, messages)
+    pages = len(offsets)
+    result_lists = [
+        [track for result in searches[i:i + pages] for track in parse_search_tracks(result.content)]
+        for i in range(0, len(searches), pages)
+    ]
+    tracks = _pick_tracks(result_lists, size)
+    if not tracks:
+        raise PlanExecutionError("searches returned no tracks", messages)
+
+    return await create_playlist_with_tracks(
+        tools_by_name, plan.playlist_name or "My Playlist", plan.description, tracks, messages
+    )
+
+
+async def create_playlist_with_tracks(tools_by_name, name, description, tracks, messages=None):
+    """
+    The side-effecting half of a plan: createPlaylist, then addTracksToPlaylist with
+    the chosen tracks, then the templated reply. Returns the messages to add to the state.
+    """
+    messages = [] if messages is None else messages
+    created = await _run_step(
+        tools_by_name,
+        [_tool_call("createPlaylist", {"name": name, "description": description, "public": False})],
+        messages,
+    )
+    playlist = parse_created_playlist(created[0].content)
+    if playlist is None:
+        raise PlanExecutionError("could not read the new playlist id", messages)
+
+    await _run_step(
+        tools_by_name,
+        [_tool_call("addTracksToPlaylist", {"playlistId": playlist["id"], "trackUris": [t["uri"] for t in tracks]})],
+        messages,
+    )
+
+    messages.append(AIMessage(content=format_reply(name, playlist, tracks)))
+    return messages
+
+
+def create_planner_node(llm, tools, llm_semaphore, history_compactor):
+    """Build the planner graph node; it runs before the assistant and may answer on its own."""
+    # Tagged internal so the plan's JSON isn't streamed to /chat/stream clients as reply text
+    planner_llm = llm.with_structured_output(PlaylistPlan).with_config(tags=["internal"])
+    tools_by_name = {tool.name: tool for tool in tools}
+    required = {"searchSpotify", "createPlaylist", "addTracksToPlaylist"}
+
+    async def planner(state):
+        if not required.issubset(tools_by_name) or not isinstance(state["messages"][-1], HumanMessage):
+            return {"messages": []}
+
+        async def invoke(prompt_messages):
+            async with llm_semaphore:
+                return await planner_llm.ainvoke([SystemMessage(content=PLANNER_PROMPT)] + prompt_messages)
+
+        async def call_llm(prompt_messages):
+            return await limiter("groq").run(invoke, prompt_messages)
+
+        try:
+            prompt_messages = await history_compactor(state["messages"])
+            plan = await with_deadline(call_llm(prompt_messages))
+        except Exception as e:
+            print(f"⚠️ Planner failed, falling back to the agent loop: {e}")
+            return {"messages": []}
+
+        if plan is None or not plan.is_playlist_request or not plan.queries:
+            return {"messages": []}
+
+        try:
+            return {"messages": await run_playlist_plan(plan, tools_by_name)}
+        except PlanExecutionError as e:
+            # Keep what was done so the assistant can finish the job instead of repeating it
+            print(f"⚠️ Playlist plan failed ({e}), falling back to the agent loop")
+            return {"messages": e.messages}
+
+    return planner
+
+
+def route_after_planner(state):
+    """End the run if the planner wrote the final reply, otherwise hand over to the assistant."""
+    last = state["messages"][-1]
+    if isinstance(last, AIMessage) and not last.tool_calls:
+        return END
+    return "assistant"
@@ -0,0 +1,144 @@
+"""
+Track preview lookup for freshly created playlists.
+
+When the agent's response already lists the track URIs it added, the tracks
+are fetched directly in one /v1/tracks call. Otherwise the playlist is polled
+with exponential backoff until its tracks show up, giving up at a deadline.
+All requests share one pooled HTTP session and the "spotify" rate limiter, and
+tokens come from the cached managers in spotify_auth.py unless the caller
+passes one.
+"""
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from rate_limits import limiter
+from spotify_auth import client_credentials, user_token
+
+SPOTIFY_API = "https://api.spotify.com/v1"
+DEFAULT_PREVIEW_DEADLINE_SECONDS = 5.0
+REQUEST_TIMEOUT_SECONDS = 5
+FIRST_POLL_DELAY_SECONDS = 0.1
+MAX_POLL_DELAY_SECONDS = 1.0
+# /v1/tracks accepts at most 50 ids; 10 is plenty to find one with a preview
+MAX_PREVIEW_CANDIDATES = 10
+
+_session = None
+
+
+def get_session():
+    """Shared keep-alive session so repeated previews reuse the same connections."""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        _session.mount("https://", adapter)
+    return _session
+
+
+def _summarize_track(track):
+    images = track.get("album", {}).get("images") or []
+    return {
+        'name': track.get('name', 'Unknown'),
+        'artist': track['artists'][0]['name'] if track.get('artists') else 'Unknown',
+        'preview_url': track.get('preview_url'),
+        'album_art': images[0]['url'] if images else None,
+    }
+
+
+def pick_preview(tracks):
+    """The first track with a preview URL, or else the first track at all."""
+    tracks = [t for t in tracks if t]
+    if not tracks:
+        return None
+    for track in tracks:
+        if track.get('preview_url'):
+            return _summarize_track(track)
+    return _summarize_track(tracks[0])
+
+
+def fetch_tracks(track_uris, access_token):
+    """Look tracks up by URI in a single request."""
+    ids = [uri.rsplit(":", 1)[-1] for uri in track_uris[:MAX_PREVIEW_CANDIDATES]]
+    response = limiter("spotify").run_sync(
+        get_session().get,
+        f"{SPOTIFY_API}/tracks",
+        params={"ids": ",".join(ids)},
+        headers={'Authorization': f'Bearer {access_token}'},
+        timeout=REQUEST_TIMEOUT_SECONDS,
+    )
+    response.raise_for_status()
+    return response.json().get("tracks") or []
+
+
+def poll_playlist_tracks(playlist_id, access_token, deadline_seconds=None):
+    """
+    Fetch the playlist's first tracks, retrying with exponential backoff while it is
+    still empty. Returns an empty list if nothing shows up before the deadline.
+    """
+    if deadline_seconds is None:
+        deadline_seconds = float(os.getenv("PREVIEW_DEADLINE_SECONDS", DEFAULT_PREVIEW_DEADLINE_SECONDS))
+    deadline = time.monotonic() + deadline_seconds
+    delay = FIRST_POLL_DELAY_SECONDS
+
+    while True:
+        response = limiter("spotify").run_sync(
+            get_session().get,
+            f"{SPOTIFY_API}/playlists/{playlist_id}/tracks",
+            params={"limit": MAX_PREVIEW_CANDIDATES},
+            headers={'Authorization': f'Bearer {access_token}'},
+            timeout=REQUEST_TIMEOUT_SECONDS,
+        )
+        response.raise_for_status()
+        items = response.json().get("items") or []
+        if items:
+            return [item.get("track") for item in items]
+
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return []
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, MAX_POLL_DELAY_SECONDS)
+
+
+def _is_unauthorized(error):
+    return isinstance(error, requests.HTTPError) and error.response is not None and error.response.status_code == 401
+
+
+def _lookup(playlist_id, access_token, track_uris):
+    if track_uris:
+        return fetch_tracks(track_uris, access_token)
+    return poll_playlist_tracks(playlist_id, access_token)
+
+
+def get_playlist_preview(playlist_id, access_token=None, track_uris=None):
+    """Get the first track with a preview URL from a playlist"""
+    try:
+        # Looking tracks up by URI works with the app token; reading a private playlist needs the user's
+        manager = user_token
+        if access_token is None:
+            access_token = user_token.get()
+            if access_token is None and track_uris:
+                manager = client_credentials
+                access_token = client_credentials.get()
+        if access_token is None:
+            print("❌ No Spotify access token available for the preview")
+            return None
+
+        try:
+            tracks = _lookup(playlist_id, access_token, track_uris)
+        except requests.HTTPError as e:
+            if not _is_unauthorized(e):
+                raise
+            # The cached token went stale early; get a fresh one and try once more
+            manager.invalidate()
+            access_token = manager.get()
+            if access_token is None:
+                raise
+            tracks = _lookup(playlist_id, access_token, track_uris)
+        return pick_preview(tracks)
+    except Exception as e:
+        print(f"❌ Error fetching playlist preview: {e}")
+        return None
@@ -0,0 +1,226 @@
+"""
+Central scheduler for outbound Spotify and Groq traffic.
+
+Every call to an upstream goes through its RateLimiter, which:
+- paces calls with a token bucket (RATE_LIMIT_<UPSTREAM>_PER_SECOND / _BURST),
+- serves interactive requests before batch work when both are waiting,
+- recognizes HTTP 429s, whether raised, returned as a response or reported in
+  an MCP tool error, and retries them with jittered exponential backoff,
+- honors Retry-After by pausing the whole upstream, not just the caller, so
+  the other requests stop hammering it too and throughput settles at the quota
+  instead of collapsing into retry storms.
+- for Groq, also retries timeouts, dropped connections and 408/409/5xx
+  answers, which the Groq SDK would otherwise retry itself (its own retries
+  are off so 429s are only handled here). Spotify calls aren't retried on
+  those, since MCP tool calls include writes such as addTracksToPlaylist.
+
+Batch work marks itself with `with batch_priority():`; everything else counts
+as interactive.
+
+Settings (UPSTREAM is SPOTIFY or GROQ):
+    RATE_LIMIT_<UPSTREAM>_PER_SECOND - sustained rate; 0 (default) means no pacing,
+                                       only 429 handling
+    RATE_LIMIT_<UPSTREAM>_BURST      - bucket size
+    RATE_LIMIT_MAX_RETRIES           - retries after a 429 (or a transient Groq error)
+"""
+import asyncio
+import contextvars
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+import groq
+import httpx
+
+from metrics import RATE_LIMIT_RETRIES, RATE_LIMIT_WAIT_SECONDS
+from spotify_results import is_error_result, message_text
+
+DEFAULT_RATE_PER_SECOND = 0
+DEFAULT_BURST = 10
+DEFAULT_MAX_RETRIES = 3
+BASE_BACKOFF_SECONDS = 0.5
+MAX_BACKOFF_SECONDS = 30.0
+INTERACTIVE = "interactive"
+BATCH = "batch"
+
+_priority = contextvars.ContextVar("request_priority", default=INTERACTIVE)
+_RATE_LIMIT_TEXT = re.compile(r"\b429\b|rate limit|too many requests", re.IGNORECASE)
+
+
+@contextmanager
+def batch_priority():
+    """Run the code inside (and every task it starts) in the batch lane."""
+    token = _priority.set(BATCH)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def _retry_after(headers):
+    value = headers.get("retry-after") if headers is not None else None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def rate_limit_delay(outcome):
+    """
+    If outcome (a result or an exception) is a rate-limit answer, return how long
+    to wait (None when the upstream didn't say); otherwise return False.
+    """
+    response = getattr(outcome, "response", None) if isinstance(outcome, Exception) else outcome
+    status = getattr(outcome, "status_code", None) or getattr(response, "status_code", None)
+    if status == 429:
+        return _retry_after(getattr(response, "headers", None))
+    # MCP tools report Spotify's 429s as an error result instead of raising
+    if not isinstance(outcome, Exception) and is_error_result(outcome):
+        text = str(outcome) if isinstance(outcome, dict) else message_text(outcome)
+        if _RATE_LIMIT_TEXT.search(text):
+            return None
+    return False
+
+
+def is_transient_error(outcome):
+    """Whether outcome is an exception for a timeout, a dropped connection or a 408/409/5xx answer."""
+    if not isinstance(outcome, Exception):
+        return False
+    if isinstance(outcome, (groq.APIConnectionError, httpx.TransportError)):
+        return True
+    status = getattr(outcome, "status_code", None) or getattr(getattr(outcome, "response", None), "status_code", None)
+    return isinstance(status, int) and (status in (408, 409) or status >= 500)
+
+
+class RateLimiter:
+    def __init__(self, name, rate_per_second=DEFAULT_RATE_PER_SECOND, burst=DEFAULT_BURST,
+                 max_retries=DEFAULT_MAX_RETRIES, retry_transient=False):
+        self.name = name
+        self.retry_transient = retry_transient
+        self.rate = rate_per_second
+        self.burst = max(1, burst)
+        self.max_retries = max_retries
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._waiting = {INTERACTIVE: 0, BATCH: 0}
+        self._lock = threading.Lock()
+
+    def _try_take(self, priority):
+        """Take a token and return 0, or return how long to wait before trying again."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if self.rate <= 0:
+                return 0.0
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Batch work only gets a token when no interactive request is waiting for one
+            if priority == BATCH and self._waiting[INTERACTIVE]:
+                return 1 / self.rate
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def _block(self, seconds):
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def _backoff(self, delay, attempt):
+        if delay is None:
+            # Full jitter, so callers that failed together don't retry together
+            return random.uniform(0, min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** attempt))
+        return delay * random.uniform(1.0, 1.1)
+
+    async def acquire(self):
+        priority = _priority.get()
+        started = time.monotonic()
+        self._waiting[priority] += 1
+        try:
+            while (wait := self._try_take(priority)) > 0:
+                await asyncio.sleep(wait)
+        finally:
+            self._waiting[priority] -= 1
+        RATE_LIMIT_WAIT_SECONDS.observe(time.monotonic() - started, upstream=self.name, priority=priority)
+
+    def acquire_sync(self):
+        started = time.monotonic()
+        while (wait := self._try_take(INTERACTIVE)) > 0:
+            time.sleep(wait)
+        RATE_LIMIT_WAIT_SECONDS.observe(time.monotonic() - started, upstream=self.name, priority=INTERACTIVE)
+
+    def _should_retry(self, outcome, attempt):
+        delay = rate_limit_delay(outcome)
+        if delay is False:
+            return None
+        RATE_LIMIT_RETRIES.inc(upstream=self.name)
+        wait = self._backoff(delay, attempt)
+        self._block(wait)
+        if attempt >= self.max_retries:
+            return None
+        print(f"⏳ {self.name} rate limited, retrying in {wait:.1f}s")
+        return wait
+
+    def _transient_wait(self, error, attempt):
+        """How long to back off before retrying a transient error, or None to give up on it."""
+        if not self.retry_transient or attempt >= self.max_retries or not is_transient_error(error):
+            return None
+        # Only this caller backs off; unlike a 429 the error says nothing about the quota
+        wait = self._backoff(None, attempt)
+        print(f"⏳ {self.name} call failed ({type(error).__name__}), retrying in {wait:.1f}s")
+        return wait
+
+    async def run(self, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) under this upstream's limits, retrying 429s (and transient errors)."""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                if (wait := self._transient_wait(e, attempt)) is not None:
+                    await asyncio.sleep(wait)
+                elif self._should_retry(e, attempt) is None:
+                    raise
+                continue
+            if self._should_retry(result, attempt) is None:
+                return result
+
+    def run_sync(self, fn, *args, **kwargs):
+        """Blocking variant of run for requests-based callers."""
+        for attempt in range(self.max_retries + 1):
+            self.acquire_sync()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if (wait := self._transient_wait(e, attempt)) is not None:
+                    time.sleep(wait)
+                elif self._should_retry(e, attempt) is None:
+                    raise
+                continue
+            if self._should_retry(result, attempt) is None:
+                return result
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter(upstream):
+    """The shared RateLimiter for an upstream ("spotify" or "groq"), built from its settings."""
+    with _limiters_lock:
+        if upstream not in _limiters:
+            prefix = f"RATE_LIMIT_{upstream.upper()}"
+            _limiters[upstream] = RateLimiter(
+                upstream,
+                rate_per_second=float(os.getenv(f"{prefix}_PER_SECOND", DEFAULT_RATE_PER_SECOND)),
+                burst=int(os.getenv(f"{prefix}_BURST", DEFAULT_BURST)),
+                max_retries=int(os.getenv("RATE_LIMIT_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+                # LLM calls are safe to repeat; Spotify tool calls may be writes
+                retry_transient=upstream == "groq",
+            )
+        return _limiters[upstream]
@@ -0,0 +1,159 @@
+"""
+Server-side conversation sessions.
+
+A session id is a LangGraph thread id: the conversation is kept by the store's
+checkpointer, so clients only send the new user message on each turn. Sessions
+that have not been used for SESSION_TTL_SECONDS are evicted.
+
+Backends (SESSION_BACKEND):
+    memory - InMemorySaver, lost on restart (default)
+    sqlite - AsyncSqliteSaver in SESSION_DB_PATH, needs langgraph-checkpoint-sqlite
+"""
+import asyncio
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+DEFAULT_SESSION_TTL_SECONDS = 60 * 60
+DEFAULT_EVICTION_INTERVAL_SECONDS = 60
+DEFAULT_SESSION_DB_PATH = "sessions.db"
+
+
+class SessionStore(ABC):
+    """
+    Base class for session backends.
+
+    Subclasses set self.checkpointer and record when each session was last used
+    so that idle sessions can be evicted.
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_SESSION_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.checkpointer = None
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    def new_session_id(self):
+        return uuid.uuid4().hex
+
+    @abstractmethod
+    async def touch(self, session_id):
+        """Mark a session as used now."""
+
+    @abstractmethod
+    async def idle_since(self, cutoff):
+        """Return the ids of sessions last used before the cutoff timestamp."""
+
+    @abstractmethod
+    async def forget(self, session_id):
+        """Drop the activity record for a session."""
+
+    async def delete(self, session_id):
+        await self.checkpointer.adelete_thread(session_id)
+        await self.forget(session_id)
+
+    async def evict_expired(self):
+        expired = await self.idle_since(time.time() - self.ttl_seconds)
+        for session_id in expired:
+            await self.delete(session_id)
+        return expired
+
+
+class InMemorySessionStore(SessionStore):
+    def __init__(self, ttl_seconds=DEFAULT_SESSION_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self.checkpointer = InMemorySaver()
+        self._last_seen = {}
+
+    async def touch(self, session_id):
+        self._last_seen[session_id] = time.time()
+
+    async def idle_since(self, cutoff):
+        return [sid for sid, seen in self._last_seen.items() if seen < cutoff]
+
+    async def forget(self, session_id):
+        self._last_seen.pop(session_id, None)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions persisted to SQLite, so conversations survive a backend restart."""
+
+    def __init__(self, path=DEFAULT_SESSION_DB_PATH, ttl_seconds=DEFAULT_SESSION_TTL_SECONDS):
+        super().__init__(ttl_seconds)
+        self.path = path
+        self._conn = None
+
+    async def open(self):
+        try:
+            import aiosqlite
+            from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+        except ImportError as e:
+            raise ImportError(
+                "The sqlite session backend needs langgraph-checkpoint-sqlite: "
+                "pip install langgraph-checkpoint-sqlite"
+            ) from e
+
+        self._conn = await aiosqlite.connect(self.path)
+        self.checkpointer = AsyncSqliteSaver(self._conn)
+        await self.checkpointer.setup()
+        await self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS session_activity (session_id TEXT PRIMARY KEY, last_seen REAL NOT NULL)"
+        )
+        await self._conn.commit()
+
+    async def close(self):
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+    async def touch(self, session_id):
+        await self._conn.execute(
+            "INSERT INTO session_activity (session_id, last_seen) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET last_seen = excluded.last_seen",
+            (session_id, time.time()),
+        )
+        await self._conn.commit()
+
+    async def idle_since(self, cutoff):
+        async with self._conn.execute(
+            "SELECT session_id FROM session_activity WHERE last_seen < ?", (cutoff,)
+        ) as cursor:
+            return [row[0] for row in await cursor.fetchall()]
+
+    async def forget(self, session_id):
+        await self._conn.execute("DELETE FROM session_activity WHERE session_id = ?", (session_id,))
+        await self._conn.commit()
+
+
+def create_session_store(backend=None, ttl_seconds=None):
+    """Build the session store selected by SESSION_BACKEND (memory or sqlite)."""
+    backend = backend or os.getenv("SESSION_BACKEND", "memory")
+    if ttl_seconds is None:
+        ttl_seconds = float(os.getenv("SESSION_TTL_SECONDS", DEFAULT_SESSION_TTL_SECONDS))
+
+    if backend == "memory":
+        return InMemorySessionStore(ttl_seconds=ttl_seconds)
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.getenv("SESSION_DB_PATH", DEFAULT_SESSION_DB_PATH), ttl_seconds=ttl_seconds)
+    raise ValueError(f"Unknown SESSION_BACKEND: {backend!r} (expected 'memory' or 'sqlite')")
+
+
+async def run_eviction_loop(store, interval=None):
+    """Periodically evict idle sessions; run as a background task."""
+    if interval is None:
+        interval = float(os.getenv("SESSION_EVICTION_INTERVAL_SECONDS", DEFAULT_EVICTION_INTERVAL_SECONDS))
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            evicted = await store.evict_expired()
+            if evicted:
+                print(f"Evicted {len(evicted)} idle session(s)")
+        except Exception as e:
+            print(f"❌ Session eviction failed: {e}")
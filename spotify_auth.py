@@ -0,0 +1,184 @@
+"""
+Cached Spotify access tokens.
+
+Two kinds of token are used outside the MCP server:
+- an app token from the client-credentials flow (credential checks, track lookups)
+- the user token the MCP server keeps in spotify-config.json (private playlists)
+
+Both are kept in memory until shortly before they expire instead of being
+fetched or reread on every use. Refreshes are single-flight: when many callers
+find the token stale at once, one refresh runs and the rest wait for it. Token
+requests go through the "spotify" rate limiter (rate_limits.py).
+
+Settings:
+    SPOTIFY_TOKEN_REFRESH_MARGIN_SECONDS - refresh this long before expiry
+    SPOTIFY_CONFIG_FILE                  - explicit path to spotify-config.json
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+
+import httpx
+import requests
+
+from rate_limits import limiter
+
+SPOTIFY_TOKEN_URL = "https://accounts.spotify.com/api/token"
+DEFAULT_REFRESH_MARGIN_SECONDS = 60
+REQUEST_TIMEOUT_SECONDS = 5
+SPOTIFY_CONFIG_PATHS = [
+    'spotify-config.json',
+    'spotify-mcp-server/spotify-config.json',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spotify-mcp-server', 'spotify-config.json'),
+]
+
+
+class SpotifyAuthError(Exception):
+    """Spotify refused to issue a token."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _refresh_margin():
+    return float(os.getenv("SPOTIFY_TOKEN_REFRESH_MARGIN_SECONDS", DEFAULT_REFRESH_MARGIN_SECONDS))
+
+
+class ClientCredentialsToken:
+    """App token from the client-credentials flow, shared by sync and async callers."""
+
+    def __init__(self):
+        self._token = None
+        self._expires_at = 0.0
+        self._client_id = None
+        self._thread_lock = threading.Lock()
+        self._async_lock = None
+        self.refreshes = 0
+
+    def _credentials(self):
+        client_id = os.getenv("SPOTIFY_CLIENT_ID")
+        client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+        if not client_id or not client_secret:
+            raise SpotifyAuthError("Missing Spotify credentials in .env file")
+        return client_id, client_secret
+
+    def _cached(self, client_id):
+        if self._token and self._client_id == client_id and time.time() < self._expires_at - _refresh_margin():
+            return self._token
+        return None
+
+    def _store(self, response, client_id):
+        if response.status_code != 200:
+            raise SpotifyAuthError(f"Spotify credentials rejected (status {response.status_code})", response.status_code)
+        payload = response.json()
+        self._token = payload["access_token"]
+        self._expires_at = time.time() + payload.get("expires_in", 3600)
+        self._client_id = client_id
+        self.refreshes += 1
+        return self._token
+
+    def get(self):
+        """Return a valid token, fetching a new one with requests if needed."""
+        client_id, client_secret = self._credentials()
+        token = self._cached(client_id)
+        if token:
+            return token
+        with self._thread_lock:
+            token = self._cached(client_id)
+            if token:
+                return token
+            response = limiter("spotify").run_sync(
+                requests.post,
+                SPOTIFY_TOKEN_URL,
+                data={"grant_type": "client_credentials", "client_id": client_id, "client_secret": client_secret},
+                timeout=REQUEST_TIMEOUT_SECONDS,
+            )
+            return self._store(response, client_id)
+
+    async def aget(self, client=None):
+        """Async variant of get; pass an httpx.AsyncClient to reuse its connections."""
+        client_id, client_secret = self._credentials()
+        token = self._cached(client_id)
+        if token:
+            return token
+        if self._async_lock is None:
+            self._async_lock = asyncio.Lock()
+        async with self._async_lock:
+            token = self._cached(client_id)
+            if token:
+                return token
+            data = {"grant_type": "client_credentials", "client_id": client_id, "client_secret": client_secret}
+            if client is not None:
+                response = await limiter("spotify").run(client.post, SPOTIFY_TOKEN_URL, data=data)
+            else:
+                async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT_SECONDS) as own_client:
+                    response = await limiter("spotify").run(own_client.post, SPOTIFY_TOKEN_URL, data=data)
+            return self._store(response, client_id)
+
+    def invalidate(self):
+        """Drop the cached token, e.g. after Spotify answered 401."""
+        self._token = None
+
+
+class UserToken:
+    """
+    The user's token from the MCP server's spotify-config.json.
+
+    The file is located once and only reread when the cached token is about to
+    expire (the MCP server writes refreshed tokens back to it) or was rejected.
+    """
+
+    def __init__(self, paths=None):
+        self._paths = paths
+        self._path = None
+        self._token = None
+        self._expires_at = None
+        self._lock = threading.Lock()
+
+    def _find_path(self):
+        explicit = os.getenv("SPOTIFY_CONFIG_FILE")
+        for path in [explicit] if explicit else (self._paths or SPOTIFY_CONFIG_PATHS):
+            if os.path.exists(path):
+                return path
+        return None
+
+    def _fresh(self):
+        if not self._token:
+            return False
+        return self._expires_at is None or time.time() < self._expires_at - _refresh_margin()
+
+    def _load(self):
+        if self._path is None:
+            self._path = self._find_path()
+        if self._path is None:
+            return
+        try:
+            with open(self._path, 'r') as f:
+                config = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"❌ Could not load Spotify config: {e}")
+            self._path = None
+            return
+        self._token = config.get('accessToken')
+        # The MCP server stores expiresAt in milliseconds
+        expires_at = config.get('expiresAt')
+        self._expires_at = expires_at / 1000 if isinstance(expires_at, (int, float)) else None
+
+    def get(self):
+        """Return the user's access token, or None if spotify-config.json can't be found."""
+        if self._fresh():
+            return self._token
+        with self._lock:
+            if not self._fresh():
+                self._load()
+            return self._token
+
+    def invalidate(self):
+        self._token = None
+
+
+client_credentials = ClientCredentialsToken()
+user_token = UserToken()
@@ -0,0 +1,97 @@
+"""
+Parsing helpers for Spotify MCP tool results.
+
+The spotify-mcp-server answers in human-readable text (numbered search
+results ending in "- ID: <track id>", "Playlist ID: ..."), while some builds
+return JSON. These helpers accept either.
+"""
+import json
+import re
+
+PLAYLIST_URL_PATTERN = re.compile(r"open\.spotify\.com/playlist/([A-Za-z0-9]+)")
+PLAYLIST_ID_PATTERN = re.compile(r"Playlist ID:\s*([A-Za-z0-9]+)")
+TRACK_URI_PATTERN = re.compile(r"spotify:track:([A-Za-z0-9]+)")
+# e.g. 1. "Song Title" by Artist One, Artist Two (3:45) - ID: 4uLU6hMCjMI75M1A2tKUQC
+SEARCH_LINE_PATTERN = re.compile(r'^\s*\d+\.\s*"(?P<name>.+)"\s+by\s+(?P<artist>.+?)(?:\s+\([\d:]+\))?\s+-\s+ID:\s*(?P<id>[A-Za-z0-9]+)', re.MULTILINE)
+
+
+def message_text(content):
+    # Chat model chunks carry either a plain string or a list of content blocks
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in content)
+    return ""
+
+
+def playlist_url(playlist_id):
+    return f"https://open.spotify.com/playlist/{playlist_id}"
+
+
+def is_error_result(content):
+    """True for the structured error payload mcp_use returns when a tool call fails."""
+    if isinstance(content, dict):
+        return "error" in content
+    try:
+        data = json.loads(message_text(content))
+    except ValueError:
+        return False
+    return isinstance(data, dict) and "error" in data and "stack" in data
+
+
+def parse_created_playlist(content):
+    """Pull the playlist id and URL out of a createPlaylist tool result."""
+    text = message_text(content)
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+
+    if isinstance(data, dict) and data.get("id"):
+        url = (data.get("external_urls") or {}).get("spotify")
+        return {"id": data["id"], "url": url or playlist_url(data["id"])}
+
+    match = PLAYLIST_URL_PATTERN.search(text) or PLAYLIST_ID_PATTERN.search(text)
+    if match:
+        return {"id": match.group(1), "url": playlist_url(match.group(1))}
+    return None
+
+
+def parse_search_tracks(content):
+    """
+    Return the tracks in a searchSpotify result as dicts with uri, name and artist,
+    in result order.
+    """
+    text = message_text(content)
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = None
+
+    if isinstance(data, list):
+        tracks = []
+        for item in data:
+            if isinstance(item, dict) and item.get("uri"):
+                artists = item.get("artists") or []
+                artist = ", ".join(a.get("name", "") if isinstance(a, dict) else str(a) for a in artists)
+                tracks.append({"uri": item["uri"], "name": item.get("name", ""), "artist": artist})
+        return tracks
+
+    tracks = [
+        {"uri": f"spotify:track:{m.group('id')}", "name": m.group("name"), "artist": m.group("artist")}
+        for m in SEARCH_LINE_PATTERN.finditer(text)
+    ]
+    if tracks:
+        return tracks
+    # Unknown layout: fall back to any track URIs in the text
+    return [{"uri": f"spotify:track:{track_id}", "name": "", "artist": ""}
+            for track_id in TRACK_URI_PATTERN.findall(text)]
+
+
+def format_search_tracks(tracks, heading):
+    """Render tracks in the spotify-mcp-server's searchSpotify layout, so parse_search_tracks reads them back."""
+    lines = [
+        f'{i + 1}. "{track["name"]}" by {track["artist"]} - ID: {track["uri"].rsplit(":", 1)[-1]}'
+        for i, track in enumerate(tracks)
+    ]
+    return f"# {heading}\n\n" + "\n".join(lines)
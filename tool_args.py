@@ -0,0 +1,285 @@
+"""
+Schema-aware repair of the arguments the model passes to tools.
+
+The model sometimes wraps values ({"limit": {"limit": 5}}), sends numbers as
+strings or a single URI instead of a list. Every tool's JSON input schema is
+compiled once into per-argument validators; before the tools node runs, each
+call's arguments are unwrapped, cast to the declared type and validated in one
+pass. Calls that still don't fit their schema are answered with an error tool
+message straight away, without a round-trip to the MCP server.
+
+Repairs and rejects are counted per tool in metrics.py
+(tool_args_repaired_total / tool_args_rejected_total).
+"""
+import json
+
+from langchain_core.messages import ToolMessage
+
+from metrics import TOOL_ARGS_REJECTED, TOOL_ARGS_REPAIRED, log_event
+
+_PYTHON_TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "array": (list,),
+    "object": (dict,),
+    "null": (type(None),),
+}
+_TRUE = {"true", "yes", "1"}
+_FALSE = {"false", "no", "0"}
+_INVALID = object()
+
+
+class ArgumentError(ValueError):
+    """The arguments can't be made to fit the tool's schema."""
+
+
+def _schema_types(schema):
+    if "type" in schema:
+        types = schema["type"]
+        return [types] if isinstance(types, str) else list(types)
+    types = []
+    for option in schema.get("anyOf", []) + schema.get("oneOf", []):
+        types.extend(t for t in _schema_types(option) if t not in types)
+    return types
+
+
+def _items_schema(schema):
+    if "items" in schema:
+        return schema["items"]
+    for option in schema.get("anyOf", []) + schema.get("oneOf", []):
+        if "items" in option:
+            return option["items"]
+    return None
+
+
+def _matches(value, json_type):
+    # bool is an int subclass, but true is not a valid integer
+    if isinstance(value, bool) and json_type in ("integer", "number"):
+        return False
+    if json_type == "integer" and isinstance(value, float):
+        return False
+    return isinstance(value, _PYTHON_TYPES.get(json_type, object))
+
+
+def _cast(value, json_type):
+    """Best-effort conversion of value to json_type, or _INVALID."""
+    if json_type == "integer":
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str):
+            try:
+                return int(value.strip())
+            except ValueError:
+                try:
+                    number = float(value.strip())
+                except ValueError:
+                    return _INVALID
+                return int(number) if number.is_integer() else _INVALID
+    elif json_type == "number":
+        if isinstance(value, str):
+            try:
+                return float(value.strip())
+            except ValueError:
+                return _INVALID
+    elif json_type == "boolean":
+        if isinstance(value, str) and value.strip().lower() in _TRUE | _FALSE:
+            return value.strip().lower() in _TRUE
+        if isinstance(value, int) and not isinstance(value, bool) and value in (0, 1):
+            return bool(value)
+    elif json_type == "string":
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+    elif json_type == "array":
+        if isinstance(value, str) and value.strip().startswith("["):
+            try:
+                parsed = json.loads(value)
+            except ValueError:
+                return _INVALID
+            return parsed if isinstance(parsed, list) else _INVALID
+        if isinstance(value, (str, int, float, dict)) and not isinstance(value, bool):
+            return [value]
+    elif json_type == "object":
+        if isinstance(value, str) and value.strip().startswith("{"):
+            try:
+                parsed = json.loads(value)
+            except ValueError:
+                return _INVALID
+            return parsed if isinstance(parsed, dict) else _INVALID
+    return _INVALID
+
+
+class _Field:
+    """Validator for one argument, compiled from its JSON schema."""
+
+    def __init__(self, name, schema):
+        self.name = name
+        self.types = _schema_types(schema)
+        self.enum = schema.get("enum")
+        self.minimum = schema.get("minimum")
+        self.maximum = schema.get("maximum")
+        items = _items_schema(schema)
+        self.items = _Field(f"{name}[]", items) if items else None
+
+    def _unwrap(self, value):
+        # The model sometimes nests the value: {"description": v}, {"limit": v} or any single-key dict
+        if "description" in value:
+            return value["description"]
+        if self.name in value:
+            return value[self.name]
+        if len(value) == 1:
+            return next(iter(value.values()))
+        return value
+
+    def coerce(self, value):
+        """Return (value, repaired) or raise ArgumentError."""
+        repaired = False
+        if isinstance(value, dict) and self.types and "object" not in self.types:
+            unwrapped = self._unwrap(value)
+            repaired = unwrapped is not value
+            value = unwrapped
+
+        if self.types and not any(_matches(value, t) for t in self.types):
+            for json_type in self.types:
+                cast = _cast(value, json_type)
+                if cast is not _INVALID:
+                    value, repaired = cast, True
+                    break
+            else:
+                raise ArgumentError(
+                    f"'{self.name}' must be {' or '.join(self.types)}, got {type(value).__name__}"
+                )
+
+        if isinstance(value, list) and self.items is not None:
+            items = []
+            for item in value:
+                item, item_repaired = self.items.coerce(item)
+                items.append(item)
+                repaired = repaired or item_repaired
+            value = items
+
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            # Out-of-range counts (e.g. limit=100 where 50 is the maximum) are clamped rather than rejected
+            if self.minimum is not None and value < self.minimum:
+                value, repaired = self.minimum, True
+            if self.maximum is not None and value > self.maximum:
+                value, repaired = self.maximum, True
+
+        if self.enum is not None and value not in self.enum:
+            raise ArgumentError(f"'{self.name}' must be one of {self.enum}, got {value!r}")
+        return value, repaired
+
+
+class _ToolValidator:
+    def __init__(self, schema):
+        self.fields = {name: _Field(name, prop) for name, prop in (schema.get("properties") or {}).items()}
+        self.required = list(schema.get("required") or [])
+        self.drop_unknown = schema.get("additionalProperties") is False
+
+    def coerce(self, args):
+        """Return (args, repaired) or raise ArgumentError."""
+        if not isinstance(args, dict):
+            raise ArgumentError(f"arguments must be an object, got {type(args).__name__}")
+        fixed, repaired = {}, False
+        for name, value in args.items():
+            field = self.fields.get(name)
+            if field is None:
+                if self.drop_unknown:
+                    repaired = True
+                else:
+                    fixed[name] = value
+                continue
+            # Explicit nulls for optional arguments are the same as leaving them out
+            if value is None and name not in self.required and "null" not in field.types:
+                repaired = True
+                continue
+            fixed[name], field_repaired = field.coerce(value)
+            repaired = repaired or field_repaired
+
+        missing = [name for name in self.required if name not in fixed]
+        if missing:
+            raise ArgumentError(f"missing required argument(s): {', '.join(missing)}")
+        return fixed, repaired
+
+
+def tool_input_schema(tool):
+    """The JSON schema of a tool's arguments, preferring the raw MCP schema when the tool has one."""
+    schema = getattr(tool, "mcp_input_schema", None)
+    if schema:
+        return schema
+    return tool.get_input_jsonschema()
+
+
+class ToolArgCoercer:
+    """Validators for every tool, compiled once when the graph is built."""
+
+    def __init__(self, tools):
+        self.validators = {tool.name: _ToolValidator(tool_input_schema(tool)) for tool in tools}
+
+    def coerce_call(self, call):
+        """Return (call with repaired args, error message or None)."""
+        validator = self.validators.get(call["name"])
+        if validator is None:
+            # Unknown tools are reported by the tools node itself
+            return call, None
+        try:
+            args, repaired = validator.coerce(call.get("args", {}))
+        except ArgumentError as e:
+            TOOL_ARGS_REJECTED.inc(tool=call["name"])
+            return call, str(e)
+        if repaired:
+            TOOL_ARGS_REPAIRED.inc(tool=call["name"])
+            log_event("tool_args_repaired", tool=call["name"], args=call.get("args"), repaired=args)
+            return {**call, "args": args}, None
+        return call, None
+
+    def check_call(self, call):
+        """Why a call can't be run even after repair, or None; unlike coerce_call, records nothing."""
+        validator = self.validators.get(call["name"])
+        if validator is None:
+            return f"unknown tool {call['name']!r}"
+        try:
+            validator.coerce(call.get("args", {}))
+        except ArgumentError as e:
+            return str(e)
+        return None
+
+    def guard(self, tools_node):
+        """
+        Wrap a tools node so each call's arguments are repaired first. Calls that
+        can't be repaired get an error result and never reach the tool.
+        """
+
+        async def tools(state, config):
+            ai_message = state["messages"][-1]
+            checked = [self.coerce_call(call) for call in ai_message.tool_calls]
+            fixed_calls = [call for call, _ in checked]
+            rejected = {call["id"]: error for call, error in checked if error}
+
+            # Same id, so the repaired message replaces the original in the history
+            updates = []
+            if fixed_calls != ai_message.tool_calls:
+                ai_message = ai_message.model_copy(update={"tool_calls": fixed_calls})
+                updates.append(ai_message)
+
+            results = {}
+            valid_calls = [call for call in fixed_calls if call["id"] not in rejected]
+            if valid_calls:
+                run_message = ai_message
+                if rejected:
+                    run_message = ai_message.model_copy(update={"tool_calls": valid_calls})
+                output = await tools_node.ainvoke({**state, "messages": state["messages"][:-1] + [run_message]}, config)
+                for message in output["messages"]:
+                    results[message.tool_call_id] = message
+
+            for call in fixed_calls:
+                if call["id"] in rejected:
+                    results[call["id"]] = ToolMessage(
+                        content=f"Error: invalid arguments for {call['name']}: {rejected[call['id']]}\n"
+                                " Please fix your mistakes.",
+                        name=call["name"], tool_call_id=call["id"], status="error",
+                    )
+            return {"messages": updates + [results[call["id"]] for call in fixed_calls if call["id"] in results]}
+
+        return tools
@@ -0,0 +1,161 @@
+"""
+TTL + LRU cache for read-only MCP tool results.
+
+Popular searches (genres, moods, artists) repeat constantly across users, so
+searchSpotify results are served from memory while they are fresh. Only tools
+listed in CACHEABLE_TOOLS are wrapped; anything that changes Spotify state
+(createPlaylist, addTracksToPlaylist, ...) always goes to the MCP server, and
+drops the cached reads of the playlist it touched (getPlaylistTracks), so a
+follow-up "what's in my playlist now?" sees the write.
+
+Settings:
+    CACHEABLE_TOOLS          - comma separated tool names (default: the read-only Spotify tools)
+    TOOL_CACHE_TTL_SECONDS   - how long a result stays fresh
+    TOOL_CACHE_MAX_ENTRIES   - LRU size bound; 0 disables the cache
+"""
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+
+from tool_wrappers import WrappedTool
+
+# Spotify tools that only read data; safe to cache and to run concurrently
+READ_ONLY_TOOLS = ["searchSpotify", "getPlaylistTracks", "getAlbums", "getAlbumTracks"]
+
+DEFAULT_CACHEABLE_TOOLS = ",".join(READ_ONLY_TOOLS)
+DEFAULT_TOOL_CACHE_TTL_SECONDS = 15 * 60
+DEFAULT_TOOL_CACHE_MAX_ENTRIES = 1024
+
+# Tools that change Spotify state are never cached, whatever CACHEABLE_TOOLS says
+WRITE_TOOLS = {"createPlaylist", "addTracksToPlaylist", "removeTracksFromPlaylist", "updatePlaylist"}
+
+
+# Free-text arguments; IDs and URIs are case-sensitive base62 and stay verbatim
+FREE_TEXT_ARGS = {"query"}
+
+
+def _normalize(args):
+    # Searches are case- and whitespace-insensitive, so fold those differences into one key
+    return {
+        k: " ".join(v.lower().split()) if k in FREE_TEXT_ARGS and isinstance(v, str) else v
+        for k, v in args.items() if v is not None
+    }
+
+
+def _is_error_result(result):
+    # mcp_use reports tool failures as a dict with an "error" key instead of raising
+    return isinstance(result, dict) and "error" in result
+
+
+class ToolResultCache:
+    def __init__(self, ttl_seconds=DEFAULT_TOOL_CACHE_TTL_SECONDS, max_entries=DEFAULT_TOOL_CACHE_MAX_ENTRIES,
+                 cacheable_tools=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        if cacheable_tools is None:
+            cacheable_tools = DEFAULT_CACHEABLE_TOOLS.split(",")
+        self.cacheable_tools = set(cacheable_tools) - WRITE_TOOLS
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.seconds_saved = 0.0
+
+    def make_key(self, tool_name, args):
+        return tool_name, json.dumps(_normalize(args), sort_keys=True, default=str)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, result, cost = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.seconds_saved += cost
+        return result
+
+    def put(self, key, result, cost):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, result, cost)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate_playlist(self, playlist_id):
+        """Drop every cached result that was read with this playlistId."""
+        stale = [key for key in self._entries if json.loads(key[1]).get("playlistId") == playlist_id]
+        for key in stale:
+            del self._entries[key]
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": len(self._entries),
+            "seconds_saved": round(self.seconds_saved, 3),
+        }
+
+    def wrap_tools(self, tools):
+        """Return the tool list with every cacheable tool and every write tool wrapped."""
+        if self.max_entries <= 0:
+            return list(tools)
+        wrapped = []
+        for tool in tools:
+            if tool.name in self.cacheable_tools:
+                tool = CachedTool.wrap(tool, cache=self)
+            elif tool.name in WRITE_TOOLS:
+                tool = InvalidatingTool.wrap(tool, cache=self)
+            wrapped.append(tool)
+        return wrapped
+
+
+class CachedTool(WrappedTool):
+    """Read-only tool whose results are served from a ToolResultCache while fresh."""
+
+    cache: Any
+
+    async def _arun(self, **kwargs):
+        key = self.cache.make_key(self.name, kwargs)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        result = await self.call_inner(kwargs)
+        if not _is_error_result(result):
+            self.cache.put(key, result, time.perf_counter() - start)
+        return result
+
+
+class InvalidatingTool(WrappedTool):
+    """Write tool that drops the cached reads of the playlist it changes."""
+
+    cache: Any
+
+    async def _arun(self, **kwargs):
+        try:
+            return await self.call_inner(kwargs)
+        finally:
+            # Also after a failure: the write may have gone through before the error
+            if kwargs.get("playlistId"):
+                self.cache.invalidate_playlist(kwargs["playlistId"])
+
+
+def create_tool_cache():
+    """Build the tool cache from the TOOL_CACHE_* settings."""
+    names = os.getenv("CACHEABLE_TOOLS", DEFAULT_CACHEABLE_TOOLS)
+    return ToolResultCache(
+        ttl_seconds=float(os.getenv("TOOL_CACHE_TTL_SECONDS", DEFAULT_TOOL_CACHE_TTL_SECONDS)),
+        max_entries=int(os.getenv("TOOL_CACHE_MAX_ENTRIES", DEFAULT_TOOL_CACHE_MAX_ENTRIES)),
+        cacheable_tools=[name.strip() for name in names.split(",") if name.strip()],
+    )
@@ -0,0 +1,63 @@
+"""
+Tools node that runs independent read-only tool calls concurrently.
+
+With PARALLEL_TOOL_CALLS enabled the model may ask for several tools in one
+turn (e.g. one searchSpotify per genre). Read-only calls in a row are run
+together, at most TOOL_MAX_CONCURRENCY at a time. Any other tool acts as a
+barrier: it runs alone, after everything before it and before everything
+after it, so createPlaylist always finishes before addTracksToPlaylist.
+Results are returned in the order the model asked for them.
+"""
+import asyncio
+
+from langchain_core.messages import ToolMessage
+
+from tool_cache import READ_ONLY_TOOLS
+
+DEFAULT_TOOL_MAX_CONCURRENCY = 4
+
+
+def plan_batches(tool_calls, read_only):
+    """Group tool calls into batches that may run concurrently, keeping the original order."""
+    batches = []
+    for index, call in enumerate(tool_calls):
+        concurrent = call["name"] in read_only
+        if concurrent and batches and batches[-1][0]:
+            batches[-1][1].append(index)
+        else:
+            batches.append((concurrent, [index]))
+    return [indexes for _, indexes in batches]
+
+
+class ParallelToolNode:
+    def __init__(self, tools, max_concurrency=DEFAULT_TOOL_MAX_CONCURRENCY, read_only=None):
+        self.tools_by_name = {tool.name: tool for tool in tools}
+        self.read_only = set(READ_ONLY_TOOLS if read_only is None else read_only)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def _run_call(self, call, config):
+        tool = self.tools_by_name.get(call["name"])
+        if tool is None:
+            return ToolMessage(content=f"Error: {call['name']} is not a valid tool.",
+                               name=call["name"], tool_call_id=call["id"], status="error")
+        async with self.semaphore:
+            try:
+                return await tool.ainvoke({**call, "type": "tool_call"}, config)
+            except Exception as e:
+                # Same shape ToolNode uses, so the model can retry with fixed arguments
+                return ToolMessage(content=f"Error: {e!r}\n Please fix your mistakes.",
+                                   name=call["name"], tool_call_id=call["id"], status="error")
+
+    async def ainvoke(self, state, config=None):
+        return await self(state, config)
+
+    async def __call__(self, state, config):
+        tool_calls = state["messages"][-1].tool_calls
+        results = [None] * len(tool_calls)
+
+        for indexes in plan_batches(tool_calls, self.read_only):
+            outputs = await asyncio.gather(*(self._run_call(tool_calls[i], config) for i in indexes))
+            for i, output in zip(indexes, outputs):
+                results[i] = output
+
+        return {"messages": results}
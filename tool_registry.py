@@ -0,0 +1,102 @@
+"""
+Discovery and filtering of the MCP tools the agent may use.
+
+Discovering tools means starting the MCP server and listing its tools over
+stdio, which dominates cold start. The discovered schemas are therefore saved
+to a versioned cache file keyed by a hash of the MCP config and the server
+build it points at. When the key matches, the tools are built straight from
+the cache and the server is only started when the first tool call needs it.
+
+Settings:
+    MCP_SCHEMA_CACHE_PATH - where the schema cache is kept
+    MCP_TOOL_ALLOWLIST    - comma separated; if set, only these tools are used
+    MCP_TOOL_DENYLIST     - comma separated; these tools are never used
+                            (default: playback and library tools the agent doesn't need)
+"""
+import hashlib
+import json
+import os
+
+SCHEMA_CACHE_VERSION = 1
+DEFAULT_SCHEMA_CACHE_PATH = os.path.join(".cache", "mcp_tools.json")
+DEFAULT_TOOL_DENYLIST = ",".join([
+    'getNowPlaying', 'getRecentlyPlayed', 'getQueue', 'playMusic', 'pausePlayback', 'skipToNext',
+    'skipToPrevious', 'resumePlayback', 'addToQueue', 'getMyPlaylists', 'getUsersSavedTracks',
+    'saveOrRemoveAlbum', 'checkUsersSavedAlbums',
+])
+
+
+def _name_list(value):
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def filter_tools(tools, allowlist=None, denylist=None):
+    """Apply the allow and deny lists (from MCP_TOOL_ALLOWLIST / MCP_TOOL_DENYLIST by default)."""
+    if allowlist is None:
+        allowlist = _name_list(os.getenv("MCP_TOOL_ALLOWLIST", ""))
+    if denylist is None:
+        denylist = _name_list(os.getenv("MCP_TOOL_DENYLIST", DEFAULT_TOOL_DENYLIST))
+    return [t for t in tools if (not allowlist or t.name in allowlist) and t.name not in denylist]
+
+
+def schema_cache_key(config_file):
+    """
+    Hash of the MCP config plus the size and modification time of every file it
+    references, so rebuilding the server (e.g. build/index.js) invalidates the cache.
+    """
+    digest = hashlib.sha256()
+    with open(config_file, "rb") as f:
+        raw = f.read()
+    digest.update(raw)
+
+    for server in json.loads(raw).get("mcpServers", {}).values():
+        for arg in server.get("args", []):
+            if isinstance(arg, str) and os.path.isfile(arg):
+                stat = os.stat(arg)
+                digest.update(f"{arg}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def load_cached_schemas(path, key):
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != SCHEMA_CACHE_VERSION or data.get("key") != key:
+        return None
+    return data.get("tools")
+
+
+def save_cached_schemas(path, key, schemas):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Write then rename so concurrent workers never read a half-written file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"version": SCHEMA_CACHE_VERSION, "key": key, "tools": schemas}, f)
+    os.replace(tmp_path, path)
+
+
+async def load_mcp_tools(mcp_pool, cache_path=None):
+    """
+    Return the pool's tools, allow/deny filtered.
+
+    Uses the schema cache when it is valid (the pool may still be cold);
+    otherwise starts the pool, discovers the tools and refreshes the cache.
+    """
+    if cache_path is None:
+        cache_path = os.getenv("MCP_SCHEMA_CACHE_PATH", DEFAULT_SCHEMA_CACHE_PATH)
+    key = schema_cache_key(mcp_pool.config_file)
+
+    schemas = load_cached_schemas(cache_path, key)
+    if schemas is None:
+        await mcp_pool.start()
+        schemas = mcp_pool.tool_schemas()
+        try:
+            save_cached_schemas(cache_path, key, schemas)
+        except OSError as e:
+            print(f"⚠️ Could not write MCP tool schema cache: {e}")
+
+    return filter_tools(mcp_pool.tools(schemas))
@@ -0,0 +1,35 @@
+"""
+Shared base for the tools that stand in front of another tool or the MCP pool
+(caching, the track catalog, pooled MCP calls, buildLargePlaylist).
+
+The outer tool is what the graph runs, so it is the one that reports the call
+to the callbacks (metrics, tracing, astream_events). Inner calls go through
+call_inner, which keeps them out of the callbacks so every call is reported
+exactly once.
+"""
+from langchain_core.tools import BaseTool
+
+
+async def call_inner(tool, args):
+    """Invoke a tool on behalf of an outer tool, without reporting it to the callbacks."""
+    return await tool.ainvoke(args, config={"callbacks": []})
+
+
+class AsyncTool(BaseTool):
+    """Tool with only an async implementation, like the MCP tools it fronts."""
+
+    def _run(self, **kwargs):
+        raise NotImplementedError(f"{self.name} only supports async operations")
+
+
+class WrappedTool(AsyncTool):
+    """Tool that takes the name and arguments of the tool it wraps and calls it through call_inner."""
+
+    tool: BaseTool
+
+    @classmethod
+    def wrap(cls, tool, **fields):
+        return cls(name=tool.name, description=tool.description, args_schema=tool.args_schema, tool=tool, **fields)
+
+    async def call_inner(self, args):
+        return await call_inner(self.tool, args)
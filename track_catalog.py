@@ -0,0 +1,315 @@
+"""
+Local catalog of Spotify tracks, so common searches skip the Spotify round-trip.
+
+Tracks (URI, name, artist and tags such as genres and moods) are kept in a
+SQLite FTS5 index on disk. The catalog grows incrementally: every live
+searchSpotify result is added, with the words of the query as tags, so the
+tracks found for "chill lofi study" are found again by "lofi" or "study
+chill". Offline dumps can be imported too:
+
+    python track_catalog.py import tracks.jsonl [--tags "jazz,late night"]
+
+where each line is {"uri", "name", "artist" or "artists", "genres" or "tags"}
+(a JSON list or raw Spotify track objects work as well).
+
+The agent uses the catalog in two ways:
+- a pre-search stage: a track search the catalog can fill completely is
+  answered from it, in the same layout as searchSpotify, with no MCP call
+- the searchLocalCatalog tool, for partial matches the agent can combine
+  with live searches
+
+When the catalog holds more than TRACK_CATALOG_MAX_TRACKS tracks, the ones
+seen least recently are dropped.
+
+Settings:
+    TRACK_CATALOG_PATH        - SQLite file
+    TRACK_CATALOG_MAX_TRACKS  - size cap; 0 (the default) disables the catalog
+"""
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any
+
+from langchain_core.tools import StructuredTool
+
+from spotify_results import format_search_tracks, is_error_result, parse_search_tracks
+from tool_wrappers import WrappedTool
+
+DEFAULT_TRACK_CATALOG_PATH = os.path.join(".cache", "tracks.db")
+DEFAULT_TRACK_CATALOG_MAX_TRACKS = 0
+DEFAULT_SEARCH_LIMIT = 10
+
+# Spotify field filters ("genre:jazz", "year:2020") are matched on their value alone
+_FIELD_FILTER = re.compile(r"\b(?:genre|artist|track|album|year|tag):", re.IGNORECASE)
+_WORD = re.compile(r"[^\W_]+")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    uri TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL,
+    artist TEXT NOT NULL,
+    tags TEXT NOT NULL DEFAULT '',
+    last_seen REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tracks_last_seen ON tracks (last_seen);
+CREATE VIRTUAL TABLE IF NOT EXISTS tracks_fts USING fts5(
+    name, artist, tags, content='tracks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS tracks_ai AFTER INSERT ON tracks BEGIN
+    INSERT INTO tracks_fts (rowid, name, artist, tags) VALUES (new.id, new.name, new.artist, new.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS tracks_ad AFTER DELETE ON tracks BEGIN
+    INSERT INTO tracks_fts (tracks_fts, rowid, name, artist, tags) VALUES ('delete', old.id, old.name, old.artist, old.tags);
+END;
+CREATE TRIGGER IF NOT EXISTS tracks_au AFTER UPDATE OF name, artist, tags ON tracks BEGIN
+    INSERT INTO tracks_fts (tracks_fts, rowid, name, artist, tags) VALUES ('delete', old.id, old.name, old.artist, old.tags);
+    INSERT INTO tracks_fts (rowid, name, artist, tags) VALUES (new.id, new.name, new.artist, new.tags);
+END;
+"""
+
+
+def query_words(text):
+    """The lowercase words of a search, without Spotify field-filter prefixes."""
+    return _WORD.findall(_FIELD_FILTER.sub(" ", text.lower()))
+
+
+def _merge_tags(old, new):
+    words = old.split()
+    words.extend(word for word in new.split() if word not in words)
+    return " ".join(words)
+
+
+class TrackCatalog:
+    def __init__(self, path=DEFAULT_TRACK_CATALOG_PATH, max_tracks=DEFAULT_TRACK_CATALOG_MAX_TRACKS):
+        self.path = path
+        self.max_tracks = max_tracks
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn = None
+        # Row count kept up to date by add and _evict, so neither has to count the table
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_tracks > 0
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.create_function("merge_tags", 2, _merge_tags, deterministic=True)
+            conn.executescript(SCHEMA)
+            self._count = conn.execute("SELECT count(*) FROM tracks").fetchone()[0]
+            self._conn = conn
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def add(self, tracks, tags=""):
+        """
+        Insert or refresh tracks ({uri, name, artist, optional tags}), adding tags
+        (the track's own plus the shared ones) to the tracks already known.
+        """
+        now = time.time()
+        rows = [
+            (t["uri"], t.get("name") or "", t.get("artist") or "",
+             " ".join(dict.fromkeys(query_words(f"{t.get('tags', '')} {tags}"))), now)
+            for t in tracks if t.get("uri", "").startswith("spotify:track:")
+        ]
+        if not rows:
+            return 0
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                last_id = conn.execute("SELECT coalesce(max(id), 0) FROM tracks").fetchone()[0]
+                conn.executemany(
+                    """
+                    INSERT INTO tracks (uri, name, artist, tags, last_seen) VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT (uri) DO UPDATE SET
+                        name = CASE WHEN excluded.name != '' THEN excluded.name ELSE name END,
+                        artist = CASE WHEN excluded.artist != '' THEN excluded.artist ELSE artist END,
+                        tags = merge_tags(tags, excluded.tags),
+                        last_seen = excluded.last_seen
+                    """,
+                    # Searches return the newest rows first, so insert the best result last
+                    reversed(rows),
+                )
+                # New rows get ids above the old maximum; refreshed ones keep theirs
+                self._count += conn.execute("SELECT count(*) FROM tracks WHERE id > ?", (last_id,)).fetchone()[0]
+                self._evict(conn)
+        return len(rows)
+
+    def _evict(self, conn):
+        excess = self._count - self.max_tracks
+        if excess > 0:
+            conn.execute("DELETE FROM tracks WHERE id IN (SELECT id FROM tracks ORDER BY last_seen LIMIT ?)",
+                         (excess,))
+            self._count -= excess
+            self.evictions += excess
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT):
+        """
+        Tracks matching every word of the query in their name, artist or tags, most
+        recently added first. Ranking by bm25 instead would score every match, which
+        takes milliseconds for a broad genre; rowid order lets FTS5 stop at the limit.
+        """
+        words = query_words(query)
+        if not words:
+            return []
+        match = " ".join(f'"{word}"' for word in words)
+        with self._lock:
+            rows = self._connect().execute(
+                """
+                SELECT tracks.uri, tracks.name, tracks.artist FROM tracks_fts
+                JOIN tracks ON tracks.id = tracks_fts.rowid
+                WHERE tracks_fts MATCH ? ORDER BY tracks_fts.rowid DESC LIMIT ?
+                """,
+                (match, limit),
+            ).fetchall()
+        return [{"uri": uri, "name": name, "artist": artist} for uri, name, artist in rows]
+
+    def count(self):
+        with self._lock:
+            self._connect()
+            return self._count
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "tracks": self.count() if self.enabled else 0,
+        }
+
+    def wrap_tools(self, tools):
+        """Return the tool list with searchSpotify answered from the catalog when it can be."""
+        if not self.enabled:
+            return list(tools)
+        return [CatalogSearchTool.wrap(tool, catalog=self) if tool.name == "searchSpotify" else tool for tool in tools]
+
+    def as_tool(self):
+        """The searchLocalCatalog tool for the agent."""
+        catalog = self
+
+        async def searchLocalCatalog(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> str:
+            tracks = catalog.search(query, limit)
+            if not tracks:
+                return f'No tracks in the local catalog match "{query}". Use searchSpotify instead.'
+            return format_search_tracks(tracks, f'Local catalog results for "{query}" (type: track)')
+
+        return StructuredTool.from_function(
+            coroutine=searchLocalCatalog,
+            name="searchLocalCatalog",
+            description=(
+                "Instantly search tracks found in earlier Spotify searches by genre, mood, artist or title. "
+                "Results use the same format and track IDs as searchSpotify; it may return fewer tracks than asked for."
+            ),
+        )
+
+
+class CatalogSearchTool(WrappedTool):
+    """searchSpotify that answers track searches from the catalog when it has enough matches."""
+
+    catalog: Any
+
+    async def _arun(self, **kwargs):
+        query = kwargs.get("query") or ""
+        is_track_search = kwargs.get("type", "track") == "track"
+        # Later pages (buildLargePlaylist) always come from Spotify
+        if is_track_search and not kwargs.get("offset"):
+            limit = kwargs.get("limit") or DEFAULT_SEARCH_LIMIT
+            tracks = self.catalog.search(query, limit)
+            if len(tracks) >= limit:
+                self.catalog.hits += 1
+                return format_search_tracks(tracks, f'Search results for "{query}" (type: track)')
+            self.catalog.misses += 1
+
+        result = await self.call_inner(kwargs)
+        if is_track_search and not is_error_result(result):
+            self.catalog.add(parse_search_tracks(result), tags=query)
+        return result
+
+
+def create_track_catalog():
+    """Build the catalog from the TRACK_CATALOG_* settings."""
+    return TrackCatalog(
+        path=os.getenv("TRACK_CATALOG_PATH", DEFAULT_TRACK_CATALOG_PATH),
+        max_tracks=int(os.getenv("TRACK_CATALOG_MAX_TRACKS", DEFAULT_TRACK_CATALOG_MAX_TRACKS)),
+    )
+
+
+IMPORT_CHUNK_SIZE = 1000
+
+
+def _import_record(item):
+    """Normalize one imported record, either our own layout or a raw Spotify track object."""
+    artist = item.get("artist")
+    if artist is None:
+        artist = ", ".join(a.get("name", "") if isinstance(a, dict) else str(a) for a in item.get("artists") or [])
+    tags = item.get("tags") or item.get("genres") or ""
+    if isinstance(tags, list):
+        tags = " ".join(tags)
+    return {"uri": item.get("uri", ""), "name": item.get("name", ""), "artist": artist, "tags": tags}
+
+
+def import_file(catalog, path, tags=""):
+    """Add the tracks in a JSON or JSON-lines file; returns how many were imported."""
+    with open(path, "r") as f:
+        text = f.read()
+    try:
+        items = json.loads(text)
+    except ValueError:
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(items, dict):
+        items = [items]
+
+    tracks = [_import_record(item) for item in items]
+    return sum(catalog.add(tracks[i:i + IMPORT_CHUNK_SIZE], tags=tags)
+               for i in range(0, len(tracks), IMPORT_CHUNK_SIZE))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the local track catalog")
+    commands = parser.add_subparsers(dest="command", required=True)
+    import_parser = commands.add_parser("import", help="import tracks from JSON or JSON-lines files")
+    import_parser.add_argument("files", nargs="+")
+    import_parser.add_argument("--tags", default="", help="extra tags for every imported track, e.g. genres")
+    search_parser = commands.add_parser("search", help="look tracks up")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--limit", type=int, default=DEFAULT_SEARCH_LIMIT)
+    args = parser.parse_args()
+
+    catalog = create_track_catalog()
+    if not catalog.enabled:
+        parser.exit(1, "❌ The catalog is disabled; set TRACK_CATALOG_MAX_TRACKS to its size cap\n")
+    if args.command == "import":
+        for path in args.files:
+            print(f"📥 Imported {import_file(catalog, path, tags=args.tags)} tracks from {path}")
+        print(f"📚 Catalog now holds {catalog.count()} tracks")
+    else:
+        started = time.perf_counter()
+        tracks = catalog.search(args.query, args.limit)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(format_search_tracks(tracks, f'{len(tracks)} catalog results for "{args.query}" in {elapsed_ms:.2f} ms'))
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()